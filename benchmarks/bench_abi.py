@@ -0,0 +1,49 @@
+"""
+Cold start and call latency in ABI mode compared to API mode.
+
+Cold start is the time from fdef to a loaded library. In API mode this
+includes building the C extension, with the extension cache disabled.
+ABI mode opens the shared library directly via ffi.dlopen instead.
+
+Run with `python benchmarks/bench_abi.py`.
+"""
+
+import time
+
+import numpy as np
+
+from fffi import FortranModule, cache
+from benchutil import BENCH_FDEF, build, rate, report
+
+
+def cold_start(tmpdir, mode):
+    start = time.perf_counter()
+    mod = FortranModule('bench', 'mod_bench', path=tmpdir, mode=mode)
+    mod.fdef(BENCH_FDEF)
+    mod.lib.compile(tmpdir=tmpdir, force=True)
+    mod.load()
+    return mod, time.perf_counter() - start
+
+
+def main():
+    tmpdir = build()
+    cache.ENABLED = False
+
+    mod_api, time_api = cold_start(tmpdir, 'api')
+    mod_abi, time_abi = cold_start(tmpdir, 'abi')
+    print('{:<40s} {:>12.3f} s'.format('cold start: API', time_api))
+    print('{:<40s} {:>12.3f} s'.format('cold start: ABI', time_abi))
+
+    vec = np.ones(10)
+    for label, call in [
+            ('noarg', lambda mod: mod.noarg()),
+            ('scalar_int', lambda mod: mod.scalar_int(1)),
+            ('vector', lambda mod: mod.vector(vec))]:
+        before = rate(lambda: call(mod_api))
+        after = rate(lambda: call(mod_abi))
+        report('{}: API'.format(label), before)
+        report('{}: ABI'.format(label), after, before)
+
+
+if __name__ == '__main__':
+    main()
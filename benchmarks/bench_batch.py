@@ -0,0 +1,35 @@
+"""
+Batched calls of a routine on many small problems.
+
+Compares a Python loop over slices of stacked arrays with a single
+batched call that loops in C over the same slices.
+
+Run with `python benchmarks/bench_batch.py [N]`.
+"""
+
+import sys
+
+import numpy as np
+
+from benchutil import build, bench_module, rate, report
+
+
+def loop(routine, arrs, x):
+    for k in range(arrs.shape[-1]):
+        routine(arrs[:, :, k], x[k])
+
+
+def main(count=10000):
+    mod = bench_module(build())
+    arrs = np.ones((3, 3, count), order='F')
+    x = np.ones(count)
+
+    print('{} calls on 3x3 arrays'.format(count))
+    before = rate(lambda: loop(mod.scale_2d, arrs, x), number=3, repeat=3)
+    after = rate(lambda: mod.scale_2d.batch(arrs, x), number=3, repeat=3)
+    report('scale_2d: Python loop', before*count)
+    report('scale_2d: batch', after*count, before*count)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
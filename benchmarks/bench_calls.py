@@ -0,0 +1,74 @@
+"""
+Calls per second of small Fortran routines via fffi.
+
+Compares calls through `call_fortran`, which resolves symbol and
+argument conversions on every call like attribute access did before
+routines were bound on `load()`, with the bound routines themselves.
+
+Array descriptors of repeated arguments are reused from the
+DescriptorCache of the library, which is compared to building them
+with `numpy2fortran` on each call.
+
+Profiled routines from `FortranLibrary.profile` are compared to plain
+bound routines, which stay unchanged while profiling is off.
+
+Scalars are written to a scratch buffer of the routine or passed by
+address as 0-d arrays, compared to allocating them with `ffi.new`.
+
+Run with `python benchmarks/bench_calls.py`.
+"""
+
+import numpy as np
+
+from fffi.fortran_wrapper import call_fortran, numpy2fortran
+
+from benchutil import build, bench_module, rate, report
+
+
+def main():
+    mod = bench_module(build())
+    ffi, lib, compiler = mod.lib._ffi, mod.lib._lib, mod.lib.compiler
+    vec = np.ones(10)
+
+    cases = [
+        ('noarg', ()),
+        ('scalar_int', (1,)),
+        ('scalar_double', (1.0,)),
+        ('vector', (vec,)),
+    ]
+
+    for name, args in cases:
+        before = rate(
+            lambda: call_fortran(ffi, lib, name, compiler, 'mod_bench', *args))
+        routine = getattr(mod, name)
+        after = rate(lambda: routine(*args))
+        attr = rate(lambda: getattr(mod, name)(*args))
+        report('{}: call_fortran'.format(name), before)
+        report('{}: bound routine'.format(name), after, before)
+        report('{}: attribute access + call'.format(name), attr, before)
+
+    before = rate(lambda: mod.vector(vec))
+    profile = mod.profile()
+    report('vector: bound routine', before)
+    report('vector: profiled routine', rate(lambda: mod.vector(vec)), before)
+    mod.profile(False)
+    print(profile.table())
+
+    func = getattr(lib, mod.scalar_double.symbol)
+    before = rate(lambda: func(ffi.new('double*', 1.0)))
+    report('scalar_double: raw cffi + ffi.new', before)
+    report('scalar_double: scratch buffer',
+           rate(lambda: mod.scalar_double(1.0)), before)
+    x = np.array(1.0)
+    report('scalar_double: 0-d array',
+           rate(lambda: mod.scalar_double(x)), before)
+
+    arr = np.ones((3, 2), order='F')
+    before = rate(lambda: numpy2fortran(ffi, arr, compiler))
+    after = rate(lambda: mod.lib._descriptors(arr))
+    report('descriptor: numpy2fortran', before)
+    report('descriptor: cached', after, before)
+
+
+if __name__ == '__main__':
+    main()
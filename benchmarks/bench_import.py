@@ -0,0 +1,51 @@
+"""
+Import time of the fffi package.
+
+Runs `python -X importtime -c "import fffi"` in fresh processes and reports
+the best cumulative import time of fffi and the modules that take longest.
+The parser with textX and multiprocessing must not be imported, as they
+are only needed for `fdef` and parallel calls.
+
+Run with `python benchmarks/bench_import.py [REPEAT]`.
+"""
+
+import subprocess
+import sys
+
+LAZY = ('textx', 'fffi.parser', 'multiprocessing')
+
+
+def importtime():
+    """
+    Returns self and cumulative import times in microseconds by module
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import fffi'],
+        stderr=subprocess.PIPE, check=True).stderr.decode()
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        selftime, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = (int(selftime), int(cumulative))
+    return times
+
+
+def main(repeat=5):
+    runs = [importtime() for _ in range(repeat)]
+    best = min(runs, key=lambda times: times['fffi'][1])
+
+    print('import fffi: {:8.2f} ms'.format(1e-3*best['fffi'][1]))
+    print('slowest modules (self time):')
+    for module, (selftime, _) in sorted(
+            best.items(), key=lambda item: -item[1][0])[:10]:
+        print('  {:<40s} {:8.2f} ms'.format(module, 1e-3*selftime))
+
+    imported = [module for module in LAZY if module in best]
+    if imported:
+        print('ERROR: imported eagerly: {}'.format(', '.join(imported)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
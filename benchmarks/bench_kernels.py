@@ -0,0 +1,109 @@
+"""
+End-to-end throughput of Fortran kernels driven from Python via fffi.
+
+Kernels in mod_kernels are a 3D stencil update, a Boris particle pusher and
+a dense linear solve. Each runs at several problem sizes from a Python loop
+over calls of the bound routine, and from the pure Fortran driver
+`kernels.x` with the same number of iterations. The difference in runtime
+is the overhead of fffi and Python, which dominates for small problems.
+Negative overheads, where fffi measures faster than the driver, show the
+noise of the timings.
+
+Run with `python benchmarks/bench_kernels.py`.
+"""
+
+import os
+import subprocess
+import time
+
+import numpy as np
+
+from fffi import FortranModule
+
+from benchutil import build
+
+KERNELS_FDEF = """
+    subroutine stencil(u, unew)
+      real(8), intent(in) :: u(:,:,:)
+      real(8), intent(inout) :: unew(:,:,:)
+    end subroutine
+
+    subroutine push(x, v, b, dt)
+      real(8), intent(inout) :: x(:,:), v(:,:)
+      real(8), intent(in) :: b(3)
+      real(8), intent(in) :: dt
+    end subroutine
+
+    subroutine solve(a, b, x)
+      real(8), intent(in) :: a(:,:), b(:)
+      real(8), intent(out) :: x(:)
+    end subroutine
+    """
+
+# Problem sizes n and number of calls for each kernel, with the unit
+# of work counted for throughput
+SIZES = {
+    'stencil': ('cells', [(8, 20000), (32, 500), (96, 10)]),
+    'push': ('particles', [(10, 100000), (1000, 2000), (100000, 20)]),
+    'solve': ('solves', [(4, 100000), (32, 5000), (256, 10)]),
+}
+
+
+def setup(mod, kernel, n):
+    """
+    Returns a function calling the kernel once on problems of size n,
+    with the same inputs as in kernels_driver.f90
+    """
+    if kernel == 'stencil':
+        u = np.ones((n, n, n), order='F')
+        unew = np.zeros((n, n, n), order='F')
+        return lambda: mod.stencil(u, unew), n**3
+    if kernel == 'push':
+        x = np.ones((3, n), order='F')
+        v = np.zeros((3, n), order='F')
+        b = np.array([0.0, 0.0, 1.0])
+        return lambda: mod.push(x, v, b, 1e-2), n
+    a = np.random.rand(n, n) + n*np.eye(n)
+    a = np.asfortranarray(a)
+    b = np.ones(n)
+    x = np.empty(n)
+    return lambda: mod.solve(a, b, x), 1
+
+
+def run_python(call, niter):
+    call()  # warm up, e.g. descriptor cache
+    start = time.perf_counter()
+    for _ in range(niter):
+        call()
+    return time.perf_counter() - start
+
+
+def run_fortran(kernel, n, niter):
+    out = subprocess.check_output(
+        [os.path.join('.', 'kernels.x'), kernel, str(n), str(niter)])
+    return float(out)
+
+
+def main():
+    tmpdir = build()
+    mod = FortranModule('kernels', 'mod_kernels', path=tmpdir)
+    mod.fdef(KERNELS_FDEF)
+    mod.compile(tmpdir=tmpdir)
+    mod.load()
+
+    print('{:<8s} {:>7s} {:>8s} {:>14s} {:>14s} {:>9s}'.format(
+        'kernel', 'n', 'calls', 'fffi [1/s]', 'Fortran [1/s]', 'overhead'))
+    for kernel, (unit, sizes) in SIZES.items():
+        for n, niter in sizes:
+            call, work = setup(mod, kernel, n)
+            time_python = run_python(call, niter)
+            time_fortran = run_fortran(kernel, n, niter)
+            overhead = (time_python - time_fortran)/time_python
+            print('{:<8s} {:>7d} {:>8d} {:>14.3e} {:>14.3e} {:>8.1f}%'
+                  .format(kernel, n, niter, work*niter/time_python,
+                          work*niter/time_fortran, 100*overhead))
+        print('  throughput in {} per second'.format(unit))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Load time of a library with many modules and exported routines.
+
+Generates NMOD Fortran modules with NSUB subroutines each, builds the
+library and its extension, then times `load` of the library and all its
+modules, which only records symbol names, and the first access of every
+routine, which resolves and binds each symbol.
+
+Run with `python benchmarks/bench_load.py [NMOD] [NSUB]`.
+"""
+
+import os
+import sys
+import time
+from tempfile import mkdtemp
+
+from fffi import FortranLibrary, FortranModule
+
+MODULE = """
+module mod_{0}
+  implicit none
+contains
+{1}
+end module mod_{0}
+"""
+
+ROUTINE = """
+  subroutine sub_{0}(n)
+    integer, intent(inout) :: n
+    n = n + {0}
+  end subroutine sub_{0}
+"""
+
+
+def build(nmod, nsub):
+    tmpdir = mkdtemp(prefix='fffi_bench_')
+    os.chdir(tmpdir)
+    with open('mod_load.f90', 'w') as f:
+        for kmod in range(nmod):
+            f.write(MODULE.format(kmod, ''.join(
+                ROUTINE.format(ksub) for ksub in range(nsub))))
+    os.system('gfortran -fPIC -shared mod_load.f90 -o libload.so')
+
+    lib = FortranLibrary('load', path=tmpdir)
+    for kmod in range(nmod):
+        FortranModule(lib, 'mod_{}'.format(kmod)).cdef(''.join(
+            'void {{mod}}_sub_{}(int32_t *n);\n'.format(ksub)
+            for ksub in range(nsub)))
+    lib.compile(tmpdir=tmpdir)
+    return tmpdir
+
+
+def main(nmod=12, nsub=250):
+    tmpdir = build(nmod, nsub)
+
+    start = time.perf_counter()
+    lib = FortranLibrary('load', path=tmpdir)
+    lib.load()
+    mods = [FortranModule(lib, 'mod_{}'.format(kmod)) for kmod in range(nmod)]
+    for mod in mods:
+        mod.load()
+    tload = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for mod in mods:
+        for ksub in range(nsub):
+            getattr(mod, 'sub_{}'.format(ksub))
+    tresolve = time.perf_counter() - start
+
+    print('{} modules with {} routines each'.format(nmod, nsub))
+    print('load library and modules:  {:8.2f} ms'.format(1e3*tload))
+    print('first access of all:       {:8.2f} ms'.format(1e3*tresolve))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
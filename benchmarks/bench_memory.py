@@ -0,0 +1,79 @@
+"""
+Bytes allocated on the Python heap per call of Fortran routines via fffi.
+
+For each kind of call, reports the peak of memory traced by tracemalloc
+during a single call, i.e. temporary allocations such as converted
+arguments and array descriptors, and the memory retained per call after
+many calls, which should be zero. Allocations outside of the Python heap
+are covered by the resident set size checks in tests/10_memory.
+
+Run with `python benchmarks/bench_memory.py [ncalls]`.
+"""
+
+import gc
+import sys
+import tracemalloc
+
+import numpy as np
+
+from fffi.fortran_wrapper import (
+    call_fortran, fortran2numpy, mangle, numpy2fortran)
+
+from benchutil import build, bench_module
+
+
+def bytes_per_call(call, ncalls):
+    call()  # fill caches
+    tracemalloc.start()
+    try:
+        gc.collect()
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        call()
+        peak = tracemalloc.get_traced_memory()[1] - start
+        for _ in range(ncalls):
+            call()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return peak, retained/ncalls
+
+
+def main(ncalls=10000):
+    mod = bench_module(build())
+    ffi, lib, compiler = mod.lib._ffi, mod.lib._lib, mod.lib.compiler
+    vec = np.ones(10)
+    arr = np.ones((3, 2), order='F')
+    x = np.array(1.0)
+    point = mod.new('point')
+    values = ffi.addressof(lib, mangle(compiler, 'mod_bench', 'values'))
+
+    cases = [
+        ('noarg', lambda: mod.noarg()),
+        ('scalar_double', lambda: mod.scalar_double(1.0)),
+        ('scalar_double 0-d array', lambda: mod.scalar_double(x)),
+        ('vector', lambda: mod.vector(vec)),
+        ('array_2d', lambda: mod.array_2d(arr)),
+        ('array_2d new array',
+         lambda: mod.array_2d(np.ones((3, 2), order='F'))),
+        ('explicit', lambda: mod.explicit(10, vec)),
+        ('string', lambda: mod.string('Hello, Fortran!')),
+        ('derived type', lambda: mod.move(point, 1.0)),
+        ('variable scalar', lambda: mod.counter),
+        ('variable array', lambda: mod.values),
+        ('call_fortran vector', lambda: call_fortran(
+            ffi, lib, 'vector', compiler, 'mod_bench', vec)),
+        ('numpy2fortran', lambda: numpy2fortran(ffi, arr, compiler)),
+        ('fortran2numpy', lambda: fortran2numpy(ffi, values[0])),
+    ]
+
+    print('{:<40s} {:>12s} {:>12s}'.format(
+        'call', 'peak [B]', 'retained [B]'))
+    for label, call in cases:
+        peak, retained = bytes_per_call(call, ncalls)
+        print('{:<40s} {:>12d} {:>12.2f}'.format(label, peak, retained))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
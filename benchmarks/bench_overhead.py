@@ -0,0 +1,145 @@
+"""
+Call overhead of fffi compared to hand-written raw cffi and ctypes calls.
+
+Each case calls a routine of mod_bench that does almost no work, so the
+rates measure the cost of calling into Fortran. The raw cffi and ctypes
+calls pass arguments prepared once outside the loop, including array
+descriptors built with `numpy2fortran`, and are a lower bound for fffi.
+Module variables are read via their symbols in the library.
+
+Run with `python benchmarks/bench_overhead.py [results.json]` to also
+store rates in calls per second, e.g. to compare releases.
+"""
+
+import ctypes
+import json
+import sys
+
+import numpy as np
+
+from fffi.fortran_wrapper import mangle, numpy2fortran
+
+from benchutil import build, bench_module, rate, report
+
+
+def cffi_cases(mod):
+    ffi, lib, compiler = mod.lib._ffi, mod.lib._lib, mod.lib.compiler
+
+    def func(name):
+        return getattr(lib, mangle(compiler, 'mod_bench', name))
+
+    n = ffi.new('int32_t*', 1)
+    x = ffi.new('double*', 1.0)
+    vec = np.ones(10)
+    desc1 = numpy2fortran(ffi, vec, compiler)
+    desc2 = numpy2fortran(ffi, np.ones((3, 2), order='F'), compiler)
+    desc3 = numpy2fortran(ffi, np.ones((3, 2, 2), order='F'), compiler)
+    nvec = ffi.new('int32_t*', 10)
+    data = ffi.from_buffer('double[]', vec)
+    string = ffi.new('char[]', b'Hello, Fortran!')
+    counter = mangle(compiler, 'mod_bench', 'counter')
+    values = ffi.addressof(lib, mangle(compiler, 'mod_bench', 'values'))
+
+    noarg, scalar_int, scalar_double = (
+        func('noarg'), func('scalar_int'), func('scalar_double'))
+    vector, array_2d, array_3d = (
+        func('vector'), func('array_2d'), func('array_3d'))
+    explicit, fstring = func('explicit'), func('string')
+    return {
+        'noarg': lambda: noarg(),
+        'scalar_int': lambda: scalar_int(n),
+        'scalar_double': lambda: scalar_double(x),
+        'vector': lambda: vector(desc1),
+        'array_2d': lambda: array_2d(desc2),
+        'array_3d': lambda: array_3d(desc3),
+        'explicit': lambda: explicit(nvec, data),
+        'string': lambda: fstring(string, 15),
+        'variable scalar': lambda: getattr(lib, counter),
+        'variable array': lambda: np.frombuffer(ffi.buffer(values)),
+    }
+
+
+def ctypes_cases(mod):
+    ffi, compiler = mod.lib._ffi, mod.lib.compiler
+    cdll = ctypes.CDLL(mod.lib.libfile)
+
+    def func(name):
+        return getattr(cdll, mangle(compiler, 'mod_bench', name))
+
+    def address(desc):  # descriptor built by fffi, kept alive in closure
+        return ctypes.c_void_p(int(ffi.cast('uintptr_t', desc)))
+
+    n = ctypes.byref(ctypes.c_int32(1))
+    x = ctypes.byref(ctypes.c_double(1.0))
+    vec = np.ones(10)
+    desc1 = numpy2fortran(ffi, vec, compiler)
+    desc2 = numpy2fortran(ffi, np.ones((3, 2), order='F'), compiler)
+    desc3 = numpy2fortran(ffi, np.ones((3, 2, 2), order='F'), compiler)
+    addr1, addr2, addr3 = address(desc1), address(desc2), address(desc3)
+    nvec = ctypes.byref(ctypes.c_int32(10))
+    data = vec.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+    string = ctypes.c_char_p(b'Hello, Fortran!')
+    strlen = ctypes.c_size_t(15)
+    counter = ctypes.c_int32.in_dll(
+        cdll, mangle(compiler, 'mod_bench', 'counter'))
+    values = mangle(compiler, 'mod_bench', 'values')
+
+    noarg, scalar_int, scalar_double = (
+        func('noarg'), func('scalar_int'), func('scalar_double'))
+    vector, array_2d, array_3d = (
+        func('vector'), func('array_2d'), func('array_3d'))
+    explicit, fstring = func('explicit'), func('string')
+    return {
+        'noarg': lambda: noarg(),
+        'scalar_int': lambda: scalar_int(n),
+        'scalar_double': lambda: scalar_double(x),
+        'vector': lambda: vector(addr1),
+        'array_2d': lambda: array_2d(addr2),
+        'array_3d': lambda: array_3d(addr3),
+        'explicit': lambda: explicit(nvec, data),
+        'string': lambda: fstring(string, strlen),
+        'variable scalar': lambda: counter.value,
+        'variable array': lambda: np.ctypeslib.as_array(
+            (ctypes.c_double*16).in_dll(cdll, values)),
+    }
+
+
+def fffi_cases(mod):
+    vec = np.ones(10)
+    arr2 = np.ones((3, 2), order='F')
+    arr3 = np.ones((3, 2, 2), order='F')
+    return {
+        'noarg': lambda: mod.noarg(),
+        'scalar_int': lambda: mod.scalar_int(1),
+        'scalar_double': lambda: mod.scalar_double(1.0),
+        'vector': lambda: mod.vector(vec),
+        'array_2d': lambda: mod.array_2d(arr2),
+        'array_3d': lambda: mod.array_3d(arr3),
+        'explicit': lambda: mod.explicit(10, vec),
+        'string': lambda: mod.string('Hello, Fortran!'),
+        'variable scalar': lambda: mod.counter,
+        'variable array': lambda: mod.values,
+    }
+
+
+def main(outfile=None):
+    mod = bench_module(build())
+    implementations = [('raw cffi', cffi_cases(mod)),
+                       ('ctypes', ctypes_cases(mod)),
+                       ('fffi', fffi_cases(mod))]
+
+    results = {}
+    for case in implementations[0][1]:
+        results[case] = {}
+        for label, cases in implementations:
+            results[case][label] = rate(cases[case])
+            report('{}: {}'.format(case, label), results[case][label],
+                   results[case]['raw cffi'] if label != 'raw cffi' else None)
+
+    if outfile is not None:
+        with open(outfile, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
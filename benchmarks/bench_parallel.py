@@ -0,0 +1,39 @@
+"""
+Scaling of concurrent calls of a PURE routine in thread and process pools.
+
+Calls a compute-bound kernel on independent arrays via `map` with 1 up to
+the given number of worker threads, which run in parallel as cffi releases
+the GIL during each call, and then of worker processes.
+
+Run with `python benchmarks/bench_parallel.py [WORKERS] [TASKS]`.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from benchutil import build, bench_module, rate, report
+
+
+def main(workers=None, tasks=64):
+    workers = workers or os.cpu_count() or 1
+    mod = bench_module(build())
+    xs = [np.ones(1000) for _ in range(tasks)]
+    niters = [2000]*tasks
+
+    print('{} calls of kernel on 1000 elements'.format(tasks))
+    for processes, label in [(False, 'threads'), (True, 'processes')]:
+        reference = None
+        for nworkers in range(1, workers+1):
+            calls = tasks*rate(
+                lambda: mod.map('kernel', xs, niters, workers=nworkers,
+                                processes=processes),
+                number=1, repeat=3)
+            report('map with {} {}'.format(nworkers, label), calls,
+                   reference)
+            reference = reference or calls
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""
+Startup cost of parsing many small `fdef` snippets.
+
+Reports how much of the time goes into building the textX metamodel
+and how much into building models from the snippets. The metamodel
+is built once per process and reused by all further `parse` calls.
+
+Run with `python benchmarks/bench_parse.py [N]`.
+"""
+
+import sys
+import time
+
+from fffi.parser import parser
+
+SNIPPET = """
+    subroutine test_{0}(x, y, n)
+      integer, intent(in) :: n
+      real(8), dimension(:) :: x
+      double precision, dimension(:,:) :: y
+    end subroutine
+    """
+
+
+def main(nsnippets=100):
+    snippets = [SNIPPET.format(k) for k in range(nsnippets)]
+
+    parser._metamodels.clear()
+    tstart = time.perf_counter()
+    parser.metamodel()
+    tmeta = time.perf_counter() - tstart
+
+    tstart = time.perf_counter()
+    for snippet in snippets:
+        parser.parse(snippet)
+    tmodel = time.perf_counter() - tstart
+
+    print('{} snippets'.format(nsnippets))
+    print('metamodel (once): {:8.2f} ms'.format(1e3*tmeta))
+    print('models (total):   {:8.2f} ms'.format(1e3*tmodel))
+    print('metamodel per parse before caching would be {:.2f} s in total'
+          .format(tmeta*nsnippets))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
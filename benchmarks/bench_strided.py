@@ -0,0 +1,46 @@
+"""
+Passing strided and C-ordered views of large arrays to Fortran.
+
+Compares passing the view directly, described by its strides in the
+array descriptor, with copying it to a Fortran-contiguous array and
+back as needed before views could be passed.
+
+Run with `python benchmarks/bench_strided.py [N]`.
+"""
+
+import sys
+
+import numpy as np
+
+from benchutil import build, bench_module, rate, report
+
+
+def copy_call(routine, view, *args):
+    arr = np.asfortranarray(view)
+    routine(arr, *args)
+    view[...] = arr
+
+
+def main(size=2000):
+    mod = bench_module(build())
+    big = np.ones((size, size), order='F')
+
+    views = [
+        ('slice [::2, :]', big[::2, :]),
+        ('slice [::-1, ::3]', big[::-1, ::3]),
+        ('C order', np.ones((size, size), order='C')),
+    ]
+
+    print('{0}x{0} array'.format(size))
+    for label, view in views:
+        for name, args in [('array_2d', ()), ('scale_2d', (1.0,))]:
+            routine = getattr(mod, name)
+            before = rate(lambda: copy_call(routine, view, *args),
+                          number=10, repeat=3)
+            after = rate(lambda: routine(view, *args), number=10, repeat=3)
+            report('{} {}: copy'.format(name, label), before)
+            report('{} {}: strided'.format(name, label), after, before)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
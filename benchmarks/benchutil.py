@@ -0,0 +1,110 @@
+"""
+Helpers shared by the benchmark scripts in this directory.
+
+Each benchmark builds the Fortran library in a temporary directory
+in the same way as the tests do, using the local Makefile.
+"""
+
+import os
+import timeit
+from shutil import copy
+from tempfile import mkdtemp
+
+from fffi import FortranModule
+
+BENCHDIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_FDEF = """
+    type point
+      real(8) :: x, y
+    end type
+
+    integer :: counter
+    real(8) :: values(16)
+
+    subroutine noarg()
+    end subroutine
+
+    subroutine scalar_int(n)
+      integer, intent(in) :: n
+    end subroutine
+
+    subroutine scalar_double(x)
+      real(8), intent(in) :: x
+    end subroutine
+
+    subroutine vector(vec)
+      real(8), intent(inout) :: vec(:)
+    end subroutine
+
+    subroutine array_2d(arr)
+      real(8), intent(inout) :: arr(:,:)
+    end subroutine
+
+    subroutine array_3d(arr)
+      real(8), intent(inout) :: arr(:,:,:)
+    end subroutine
+
+    subroutine explicit(n, vec)
+      integer, intent(in) :: n
+      real(8), intent(inout) :: vec(n)
+    end subroutine
+
+    subroutine string(s)
+      character(len=*), intent(in) :: s
+    end subroutine
+
+    subroutine move(p, dx)
+      type(point), intent(inout) :: p
+      real(8), intent(in) :: dx
+    end subroutine
+
+    subroutine scale_2d(arr, x)
+      real(8), intent(inout) :: arr(:,:)
+      real(8), intent(in) :: x
+    end subroutine
+
+    pure subroutine kernel(x, niter)
+      real(8), intent(inout) :: x(:)
+      integer, intent(in) :: niter
+    end subroutine
+    """
+
+
+def build(sources=('Makefile', 'mod_bench.f90', 'mod_kernels.f90',
+                   'kernels_driver.f90'), tmpdir=None):
+    """
+    Copies sources to a temporary directory and runs make there
+    """
+    if tmpdir is None:
+        tmpdir = mkdtemp(prefix='fffi_bench_')
+    for source in sources:
+        copy(os.path.join(BENCHDIR, source), tmpdir)
+    os.chdir(tmpdir)
+    os.system('make -s')
+    return tmpdir
+
+
+def bench_module(tmpdir, fdef=BENCH_FDEF):
+    """
+    Compiles and loads the benchmark module mod_bench in libbench
+    """
+    mod = FortranModule('bench', 'mod_bench', path=tmpdir)
+    mod.fdef(fdef)
+    mod.compile(tmpdir=tmpdir)
+    mod.load()
+    return mod
+
+
+def rate(func, number=100000, repeat=5):
+    """
+    Returns the best rate of calls per second of `func` without arguments
+    """
+    return number/min(timeit.repeat(func, number=number, repeat=repeat))
+
+
+def report(label, calls_per_second, reference=None):
+    line = '{:<40s} {:>12.0f} calls/s'.format(label, calls_per_second)
+    if reference:
+        line += '  ({:.2f}x)'.format(calls_per_second/reference)
+    print(line)
@@ -0,0 +1,60 @@
+! Runs a kernel of mod_kernels `niter` times for problem size n and
+! prints the elapsed wall time in seconds, as reference for fffi calls.
+! Usage: ./kernels.x stencil|push|solve n niter
+program kernels_driver
+  use mod_kernels
+  implicit none
+
+  character(len=16) :: kernel, arg
+  integer :: n, niter, iter, k
+  integer(8) :: start, finish, rate
+  real(8), allocatable :: u(:,:,:), unew(:,:,:), x(:,:), v(:,:), &
+    a(:,:), b(:), sol(:)
+  real(8) :: bfield(3) = [0d0, 0d0, 1d0]
+
+  call get_command_argument(1, kernel)
+  call get_command_argument(2, arg)
+  read(arg, *) n
+  call get_command_argument(3, arg)
+  read(arg, *) niter
+
+  select case (trim(kernel))
+  case ('stencil')
+    allocate(u(n,n,n), unew(n,n,n))
+    u = 1d0
+    unew = 0d0
+    call stencil(u, unew)
+    call system_clock(start, rate)
+    do iter = 1, niter
+      call stencil(u, unew)
+    end do
+    call system_clock(finish)
+  case ('push')
+    allocate(x(3,n), v(3,n))
+    x = 1d0
+    v = 0d0
+    call push(x, v, bfield, 1d-2)
+    call system_clock(start, rate)
+    do iter = 1, niter
+      call push(x, v, bfield, 1d-2)
+    end do
+    call system_clock(finish)
+  case ('solve')
+    allocate(a(n,n), b(n), sol(n))
+    call random_number(a)
+    do k = 1, n
+      a(k,k) = a(k,k) + n
+    end do
+    b = 1d0
+    call solve(a, b, sol)
+    call system_clock(start, rate)
+    do iter = 1, niter
+      call solve(a, b, sol)
+    end do
+    call system_clock(finish)
+  case default
+    stop 'Unknown kernel'
+  end select
+
+  print *, dble(finish - start)/dble(rate)
+end program kernels_driver
@@ -0,0 +1,75 @@
+module mod_bench
+  implicit none
+
+  type point
+    real(8) :: x, y
+  end type point
+
+  integer :: counter = 0
+  real(8) :: values(16) = 0d0
+
+contains
+
+  subroutine noarg()
+    counter = counter + 1
+  end subroutine noarg
+
+  subroutine scalar_int(n)
+    integer, intent(in) :: n
+    counter = counter + n
+  end subroutine scalar_int
+
+  subroutine scalar_double(x)
+    real(8), intent(in) :: x
+    if (x > 0d0) counter = counter + 1
+  end subroutine scalar_double
+
+  subroutine vector(vec)
+    real(8), intent(inout) :: vec(:)
+    vec(1) = vec(1) + 1d0
+  end subroutine vector
+
+  subroutine array_2d(arr)
+    real(8), intent(inout) :: arr(:,:)
+    arr(1,1) = arr(1,1) + 1d0
+  end subroutine array_2d
+
+  subroutine array_3d(arr)
+    real(8), intent(inout) :: arr(:,:,:)
+    arr(1,1,1) = arr(1,1,1) + 1d0
+  end subroutine array_3d
+
+  subroutine explicit(n, vec)
+    integer, intent(in) :: n
+    real(8), intent(inout) :: vec(n)
+    vec(1) = vec(1) + 1d0
+  end subroutine explicit
+
+  subroutine string(s)
+    character(len=*), intent(in) :: s
+    counter = counter + len(s)
+  end subroutine string
+
+  subroutine move(p, dx)
+    type(point), intent(inout) :: p
+    real(8), intent(in) :: dx
+    p%x = p%x + dx
+  end subroutine move
+
+  subroutine scale_2d(arr, x)
+    real(8), intent(inout) :: arr(:,:)
+    real(8), intent(in) :: x
+    arr = x*arr
+  end subroutine scale_2d
+
+  pure subroutine kernel(x, niter)
+    real(8), intent(inout) :: x(:)
+    integer, intent(in) :: niter
+    integer :: k
+
+    do k = 1, niter
+      x = sqrt(x + 1d0)
+    end do
+  end subroutine kernel
+
+end module mod_bench
@@ -0,0 +1,80 @@
+module mod_kernels
+  implicit none
+
+contains
+
+  ! Jacobi update of the 7-point Laplace stencil on interior points
+  subroutine stencil(u, unew)
+    real(8), intent(in) :: u(:,:,:)
+    real(8), intent(inout) :: unew(:,:,:)
+    integer :: i, j, k
+
+    do k = 2, size(u, 3) - 1
+      do j = 2, size(u, 2) - 1
+        do i = 2, size(u, 1) - 1
+          unew(i,j,k) = (u(i-1,j,k) + u(i+1,j,k) + u(i,j-1,k) &
+            + u(i,j+1,k) + u(i,j,k-1) + u(i,j,k+1))/6d0
+        end do
+      end do
+    end do
+  end subroutine stencil
+
+  ! Boris push of particles in a uniform magnetic field b and
+  ! the electric field e = -x of a harmonic potential
+  subroutine push(x, v, b, dt)
+    real(8), intent(inout) :: x(:,:), v(:,:)
+    real(8), intent(in) :: b(3)
+    real(8), intent(in) :: dt
+    real(8) :: t(3), s(3), vm(3), vp(3)
+    integer :: k
+
+    t = 0.5d0*dt*b
+    s = 2d0*t/(1d0 + sum(t**2))
+    do k = 1, size(x, 2)
+      vm = v(:,k) - 0.5d0*dt*x(:,k)
+      vp = vm + cross(vm + cross(vm, t), s)
+      v(:,k) = vp - 0.5d0*dt*x(:,k)
+      x(:,k) = x(:,k) + dt*v(:,k)
+    end do
+  end subroutine push
+
+  pure function cross(a, b)
+    real(8), intent(in) :: a(3), b(3)
+    real(8) :: cross(3)
+
+    cross = [a(2)*b(3) - a(3)*b(2), a(3)*b(1) - a(1)*b(3), &
+             a(1)*b(2) - a(2)*b(1)]
+  end function cross
+
+  ! Solves a x = b by Gaussian elimination with partial pivoting
+  subroutine solve(a, b, x)
+    real(8), intent(in) :: a(:,:), b(:)
+    real(8), intent(out) :: x(:)
+    real(8) :: lu(size(a, 1), size(a, 2)), row(size(a, 2)), tmp
+    integer :: n, k, p
+
+    n = size(a, 1)
+    lu = a
+    x = b
+    do k = 1, n - 1
+      p = k - 1 + maxloc(abs(lu(k:n,k)), 1)
+      if (p /= k) then
+        row = lu(k,:)
+        lu(k,:) = lu(p,:)
+        lu(p,:) = row
+        tmp = x(k)
+        x(k) = x(p)
+        x(p) = tmp
+      end if
+      lu(k+1:n,k) = lu(k+1:n,k)/lu(k,k)
+      do p = k + 1, n
+        lu(k+1:n,p) = lu(k+1:n,p) - lu(k+1:n,k)*lu(k,p)
+      end do
+      x(k+1:n) = x(k+1:n) - lu(k+1:n,k)*x(k)
+    end do
+    do k = n, 1, -1
+      x(k) = (x(k) - sum(lu(k,k+1:n)*x(k+1:n)))/lu(k,k)
+    end do
+  end subroutine solve
+
+end module mod_kernels
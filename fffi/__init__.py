@@ -3,7 +3,36 @@ Created: Fri Mar 29 2019
 @author: Christopher Albert <albert@alumni.tugraz.at>
 """
 
+import importlib
+
 from .common import *
-from .parser import *
 from .fortran_wrapper   import *
 from .fffi   import *
+
+# Imported on first access, so that `import fffi` does not load textX
+# for the parser or multiprocessing for parallel calls
+_submodules = ('parallel', 'parser', 'profile', 'shared')
+_shared = ('SharedArray', 'SharedHandle', 'shared_array')
+_parser = ('ArrayExplicitShapeSpec', 'ArraySpec', 'Declaration',
+           'DeclarationAttribute', 'DeclarationEntityFunction',
+           'DeclarationEntityObject', 'DerivedType', 'DerivedTypeDefinition',
+           'Fortran', 'InternalSubprogram', 'InternalSubprogramHeading',
+           'Module', 'Stmt', 'SubprogramEnding', 'SubprogramHeading',
+           'Variable', 'ast_to_dict', 'declaration_type', 'dtype_registry',
+           'get_by_name', 'metamodel')
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    if name in _shared:
+        return getattr(importlib.import_module('.shared', __name__), name)
+    if name in _parser:  # names of the parser as before
+        return getattr(importlib.import_module('.parser', __name__), name)
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules) | set(_shared)
+                  | set(_parser))
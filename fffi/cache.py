@@ -0,0 +1,163 @@
+"""
+Persistent cache for results that depend only on their inputs, such as
+C signatures and interfaces generated from Fortran source in `fdef`.
+
+Entries are stored in files named by a hash of their inputs within a
+subdirectory of `cachedir()` per kind, which is pruned separately. The
+cache can be switched off by setting ENABLED = False or the environment
+variable FFFI_CACHE=0. Its location is given by FFFI_CACHE_DIR and
+defaults to ~/.cache/fffi.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1  # increase when format of cached results changes
+
+ENABLED = os.environ.get('FFFI_CACHE', '1') != '0'
+# Bytes per kind of entry, least recently used entries are evicted
+MAX_SIZE = {'fdef': 64*1024**2, 'build': 1024**3}
+DEFAULT_MAX_SIZE = 64*1024**2  # for other kinds
+MAX_AGE = 30*24*3600  # seconds since last use
+
+
+def cachedir():
+    if 'FFFI_CACHE_DIR' in os.environ:
+        return os.environ['FFFI_CACHE_DIR']
+    return os.path.join(
+        os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+        'fffi')
+
+
+def key(*inputs):
+    """
+    Returns a hash of JSON-serializable inputs to be used as a cache key
+    """
+    text = json.dumps([CACHE_VERSION, inputs], sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def files_hash(paths):
+    """
+    Returns a hash of the content of files, e.g. source code that
+    determines cached results
+    """
+    sha = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def entry_path(kind, entrykey):
+    return os.path.join(cachedir(), kind, entrykey + '.json')
+
+
+def load(kind, entrykey):
+    """
+    Returns the cached value of given kind for the key, or None if not found
+    """
+    if not ENABLED:
+        return None
+
+    path = entry_path(kind, entrykey)
+    try:
+        with open(path, 'r') as f:
+            value = json.load(f)
+    except (OSError, ValueError):
+        return None
+    touch(path)
+
+    log.debug('Cache hit for %s %s', kind, entrykey)
+    return value
+
+
+def store(kind, entrykey, value):
+    """
+    Stores a JSON-serializable value under the key and evicts old entries
+    """
+    if not ENABLED:
+        return
+
+    path = entry_path(kind, entrykey)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmppath, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmppath, path)  # atomic for concurrent processes
+    except OSError as err:
+        log.debug('Cannot write cache entry %s: %s', path, err)
+        return
+
+    prune(kind)
+
+
+def touch(path):
+    """
+    Marks a cache entry as recently used to protect it from eviction
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune(kind=None, maxsize=None, maxage=None):
+    """
+    Removes entries of given kind older than maxage and least recently used
+    entries beyond a total size of maxsize. Each kind has its own maximum
+    size in MAX_SIZE, and all kinds are pruned if kind is None.
+    """
+    if kind is None:
+        try:
+            kinds = os.listdir(cachedir())
+        except OSError:
+            return
+        for kind in kinds:
+            prune(kind, maxsize, maxage)
+        return
+
+    if maxsize is None:
+        maxsize = MAX_SIZE.get(kind, DEFAULT_MAX_SIZE)
+    if maxage is None:
+        maxage = MAX_AGE
+
+    kinddir = os.path.join(cachedir(), kind)
+    entries = []
+    dirs = []
+    for root, subdirs, files in os.walk(kinddir):
+        dirs.extend(os.path.join(root, subdir) for subdir in subdirs)
+        for filename in files:
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    now = time.time()
+    size = 0
+    for mtime, filesize, path in sorted(entries, reverse=True):
+        size += filesize
+        if size > maxsize or now - mtime > maxage:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # Remove directories left empty, e.g. of evicted builds, deepest first
+    for path in sorted(dirs, reverse=True):
+        try:
+            os.rmdir(path)
+        except OSError:  # not empty
+            pass
+
+
+def clear():
+    prune(maxsize=0)
@@ -1,7 +1,11 @@
-import inspect
-import os
+import logging
 import sys
 
+# Diagnostics are logged to the logger of each module below 'fffi'. Set its
+# level, e.g. logging.getLogger('fffi').setLevel(logging.DEBUG), to see them.
+log = logging.getLogger('fffi')
+
+# Used by `warn` and `debug` only, configure the 'fffi' logger instead
 LOG_WARN = True
 LOG_DEBUG = False
 
@@ -15,22 +19,10 @@ elif 'win' in sys.platform:
 
 
 def warn(output):
-    caller_frame = inspect.currentframe().f_back
-    (filename, line_number,
-     function_name, _, _) = inspect.getframeinfo(caller_frame)
-    filename = os.path.split(filename)[-1]
-    print('')
-    print('WARNING {}:{} {}():'.format(filename, line_number, function_name))
-    print(output)
+    if LOG_WARN:
+        log.warning(output, stacklevel=2)
 
 
 def debug(output):
-    if not LOG_DEBUG:
-        return
-    caller_frame = inspect.currentframe().f_back
-    (filename, line_number,
-     function_name, _, _) = inspect.getframeinfo(caller_frame)
-    filename = os.path.split(filename)[-1]
-    print('')
-    print('DEBUG {}:{} {}():'.format(filename, line_number, function_name))
-    print(output)
+    if LOG_DEBUG:
+        log.debug(output, stacklevel=2)
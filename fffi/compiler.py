@@ -0,0 +1,128 @@
+"""
+Detection of the Fortran compiler that built a shared library.
+
+Compilers record their name and version in the `.comment` section of ELF
+files, which is read here directly without external tools. For other
+formats, such as Mach-O on macOS, the file is scanned for the same
+identification strings instead. Results are cached per path, modification
+time and size.
+"""
+
+import logging
+import mmap
+import os
+import re
+import struct
+
+log = logging.getLogger(__name__)
+
+# Identification strings of compilers, ordered by priority. Libraries built
+# by Intel Fortran also contain GCC strings from system objects.
+COMPILER_PATTERNS = [
+    ('ifort', re.compile(
+        rb'Intel\(R\) Fortran[^\0]{0,200}?(?:Version|Compiler) (\d+)')),
+    ('gfortran', re.compile(rb'GCC: \([^)\0]*\) (\d+)')),
+    ('flang', re.compile(rb'flang[^\0]{0,80}?version (\d+)', re.IGNORECASE)),
+    ('nvfortran', re.compile(
+        rb'(?:nvfortran|PGI Compilers and Tools|NVIDIA HPC SDK)'
+        rb'[^\0]{0,80}?(\d+)\.')),
+]
+
+_detected = {}  # compiler by (path, mtime, size)
+
+
+def _unpack(fmt, data, offset=0):
+    return struct.unpack_from(fmt, data, offset)
+
+
+def read_comment(path):
+    """
+    Returns the contents of the `.comment` section of an ELF file as a list
+    of byte strings, or None if the file is not ELF or has no such section
+    """
+    with open(path, 'rb') as f:
+        ident = f.read(16)
+        if len(ident) < 16 or ident[:4] != b'\x7fELF':
+            return None
+        endian = '<' if ident[5] == 1 else '>'
+        if ident[4] == 2:  # 64 bit
+            header = endian + 'HHIQQQIHHHHHH'
+            section = endian + 'IIQQQQIIQQ'
+        else:
+            header = endian + 'HHIIIIIHHHHHH'
+            section = endian + 'IIIIIIIIII'
+
+        fields = _unpack(header, f.read(struct.calcsize(header)))
+        shoff, shentsize, shnum, shstrndx = (
+            fields[5], fields[10], fields[11], fields[12])
+        if shoff == 0:
+            return None
+
+        def section_header(index):
+            f.seek(shoff + index*shentsize)
+            values = _unpack(section, f.read(struct.calcsize(section)))
+            # name, type, flags, addr, offset, size, link, ...
+            return values[0], values[4], values[5], values[6]
+
+        if shnum == 0 or shstrndx == 0xffff:  # extended numbering
+            _, _, size, link = section_header(0)
+            shnum = shnum or size
+            if shstrndx == 0xffff:
+                shstrndx = link
+
+        _, stroffset, strsize, _ = section_header(shstrndx)
+        f.seek(stroffset)
+        names = f.read(strsize)
+
+        for index in range(shnum):
+            name, offset, size, _ = section_header(index)
+            if names[name:names.find(b'\0', name)] == b'.comment':
+                f.seek(offset)
+                return [entry for entry in f.read(size).split(b'\0')
+                        if entry]
+    return None
+
+
+def scan_strings(path):
+    """
+    Returns the first compiler identification string of each kind found
+    in a file of any format, as a list of byte strings
+    """
+    found = []
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return found
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for _, pattern in COMPILER_PATTERNS:
+                match = pattern.search(data)
+                if match:
+                    found.append(match.group(0))
+    return found
+
+
+def identify(comments):
+    """
+    Returns compiler name and major version from identification strings
+    """
+    for name, pattern in COMPILER_PATTERNS:
+        for comment in comments:
+            match = pattern.search(comment)
+            if match:
+                return {'name': name, 'version': int(match.group(1))}
+    return None
+
+
+def detect_compiler(path):
+    """
+    Returns the compiler of a library as a dict with name and major version,
+    or None if it cannot be determined
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _detected:
+        comments = read_comment(path)
+        if comments is None:
+            comments = scan_strings(path)
+        log.debug('Compiler comments %s', comments)
+        _detected[key] = identify(comments)
+    return _detected[key]
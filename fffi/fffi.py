@@ -6,30 +6,232 @@ Created on Tue Dec 12 14:32:32 2017
 @author: Christopher Albert <albert@alumni.tugraz.at>
 """
 import importlib
+import json
+import logging
 import os
-import re
+import platform
 import sys
-import subprocess
+import sysconfig
+import weakref
 from pathlib import Path
+from shutil import copyfile
 
+import cffi
 from cffi import FFI
 
-from .common import libexts, debug, warn
-from .parser import parse
+from . import cache
+from .common import libexts
+from .compiler import detect_compiler
 from .fortran_wrapper import (
-    arraydescr, arraydims, call_fortran,
-    numpy2fortran, fortran2numpy, ccodegen
+    arraydescr, arraydims, ccodegen, ccodegen_batch, demangle, interface,
+    mangle, numpy_dtype, DescriptorCache, FortranRoutine, FortranVariable
 )
 
+log = logging.getLogger(__name__)
+
+_codegen_hash = None
+
+
+def parse(inputs, debug=False):
+    """
+    Parses Fortran source code. The parser and textX are only imported
+    here, so that loading compiled libraries does not depend on them.
+    """
+    from .parser import parse as parse_fortran
+    return parse_fortran(inputs, debug)
+
+
+def codegen_hash():
+    """
+    Returns a hash of the parser and code generator, so that cached
+    results of `fdef` are invalidated when they change
+    """
+    global _codegen_hash
+    if _codegen_hash is None:
+        thisdir = os.path.dirname(__file__)
+        _codegen_hash = cache.files_hash([
+            os.path.join(thisdir, 'parser', 'grammar.tx'),
+            os.path.join(thisdir, 'parser', 'parser.py'),
+            os.path.join(thisdir, 'fortran_wrapper.py')])
+    return _codegen_hash
+
+
+def fortran_interface(fsource, compiler, module):
+    """
+    Returns C signatures and interface for Fortran source code or file.
+    Results are cached on disk, so textX is skipped if the source is unchanged.
+    """
+    if os.path.isfile(fsource):
+        with open(fsource, 'r') as f:
+            fsource = f.read()
+
+    key = cache.key(fsource, compiler, module, codegen_hash())
+    cached = cache.load('fdef', key)
+    if cached is not None:
+        return cached['csource'], cached['interface']
+
+    ast = parse(fsource)
+    csource = ccodegen(ast, module=module)
+    fortinterface = interface(ast)
+    cache.store('fdef', key, {'csource': csource, 'interface': fortinterface})
+    return csource, fortinterface
+
+
+def fingerprint_path(target):
+    return os.path.splitext(target)[0] + '.build.json'
+
+
+def read_fingerprint(target):
+    try:
+        with open(fingerprint_path(target), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_fingerprint(target, fingerprint):
+    with open(fingerprint_path(target), 'w') as f:
+        json.dump(fingerprint, f)
+
+
+def build_fingerprint(target, inputs, files):
+    """
+    Returns the fingerprint of a build from its inputs and the content of
+    files. Hashes of unchanged files are reused from the previous build.
+    """
+    previous = read_fingerprint(target) or {}
+    known = previous.get('files', {})
+    filestats = {}
+    for path in files:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        filestat = [stat.st_mtime_ns, stat.st_size]
+        if path in known and known[path][:2] == filestat:
+            filestats[path] = known[path]
+        else:
+            filestats[path] = filestat + [cache.files_hash([path])]
+
+    filehashes = sorted(filestat[2] for filestat in filestats.values())
+    return {'key': cache.key(inputs, filehashes), 'files': filestats}
+
+
+def platform_tag():
+    """
+    Returns the interpreter, extension ABI and cffi version that a compiled
+    extension depends on, as its name `_<name>.so` carries no ABI tag
+    """
+    return [sys.implementation.cache_tag,
+            sysconfig.get_config_var('EXT_SUFFIX'),
+            platform.machine(), cffi.__version__]
+
+
+def fingerprint_matches(target, fingerprint):
+    previous = read_fingerprint(target)
+    return (os.path.exists(target) and previous is not None
+            and previous['key'] == fingerprint['key'])
+
+
+MANIFEST_VERSION = 2  # increase when the format of manifests changes
+
+
+def manifest_path(directory, name):
+    return os.path.join(directory, '_{}.manifest.json'.format(name))
+
+
+def write_manifest(path, manifest):
+    """
+    Writes the manifest atomically, unless it is already up to date
+    """
+    text = json.dumps(manifest, separators=(',', ':'))
+    try:
+        with open(path, 'r') as f:
+            if f.read() == text:
+                return
+    except OSError:
+        pass
+    tmppath = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmppath, 'w') as f:
+        f.write(text)
+    os.replace(tmppath, path)
+
+
+def read_manifest(path, compiler):
+    """
+    Returns the manifest at path if it exists and matches the compiler
+    """
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (manifest.get('version') != MANIFEST_VERSION
+            or manifest.get('compiler') != compiler):
+        log.debug('Ignoring outdated manifest %s', path)
+        return None
+    return manifest
+
+
+def copy_atomic(src, dst):
+    # Replace instead of overwriting, as dst may be loaded by other processes
+    tmpdst = '{}.{}.tmp'.format(dst, os.getpid())
+    copyfile(src, tmpdst)
+    os.replace(tmpdst, dst)
+
+
+def _bind(obj, name, routine):
+    # Instance attributes are found without falling back to __getattr__
+    obj.__dict__[name] = routine
+
+
+def _is_routine(ffi, attr):
+    """
+    Returns True if attribute of a loaded library is a routine, being
+    a function in API mode or a function pointer in ABI mode
+    """
+    if isinstance(attr, ffi.CData):
+        return ffi.typeof(attr).kind == 'function'
+    return callable(attr)
+
+
+def _check_shadowed(obj, names):
+    """
+    Warns about Fortran names that cannot be accessed as attributes
+    because of methods of the class of obj
+    """
+    for name in sorted(set(names).intersection(dir(type(obj)))):
+        log.warning('Routine %s is shadowed by a method of %s.',
+                    name, type(obj).__name__)
+
 
 class FortranLibrary:
-    def __init__(self, name, maxdim=7, path=None, compiler=None):
+    """
+    Interface to a Fortran shared library lib<name>.
+
+    In the default API mode, `compile` builds a Python extension in C that
+    is imported by `load`. In ABI mode with `mode='abi'`, `load` opens the
+    shared library directly via `ffi.dlopen` based on signatures from
+    `fdef` or `cdef`, without compiling anything. Calls are slower in ABI
+    mode, and batched calls are not available.
+    """
+
+    def __init__(self, name, maxdim=7, path=None, compiler=None, mode='api'):
+        if mode not in ('api', 'abi'):
+            raise ValueError("mode must be 'api' or 'abi', got {}".format(
+                mode))
         self.name = name
+        self.mode = mode
         self.maxdim = maxdim  # maximum dimension of arrays
         self.csource = ''
+        self.csources = {}  # C source by module name, for manifests
         self.loaded = False
         self.compiler = compiler
         self.methods = set()
+        self.interfaces = {}  # signatures from fdef, by module name
+        self._pool = None
+        self._process_pool = None
+        self.profiler = None  # timings of calls if profiled
+        self._profiling = False
+        self._routines = weakref.WeakSet()  # bound routines for profiling
 
         if isinstance(path, Path):
             self.path = path.__str__()
@@ -44,28 +246,25 @@ class FortranLibrary:
         libfile = None
         for libext in libexts:
             libfile = os.path.join(self.libpath, 'lib'+name+libext)
-            print(libfile)
+            log.debug('Looking for %s', libfile)
             if os.path.exists(libfile):
                 break
             else:
                 libfile = None
-            
+
         if libfile is None:
             raise RuntimeError(
                 f'Cannot find library {name} with extensions {libexts}')
+        self.libfile = libfile
 
         if self.compiler is None:
-            libstrings = subprocess.check_output(
-                ['strings', libfile]
-            )
-            libstrings = libstrings.decode('utf-8').split('\n')
-            for line in libstrings:
-                if line.startswith('GCC:') or line.startswith('@GCC:'):
-                    debug(line)
-                    major = int(line.split(')')[-1].split('.')[0])
-                    self.compiler = {'name': 'gfortran', 'version': major}
-                    debug(self.compiler)
-                    break
+            self.compiler = detect_compiler(libfile)
+            log.debug('Detected compiler %s', self.compiler)
+            if (self.compiler is not None
+                    and self.compiler['name'] not in ('gfortran', 'ifort')):
+                log.warning('Library %s is built with unsupported compiler %s, '
+                            'assuming gfortran.', libfile, self.compiler)
+                self.compiler = None
 
         if self.compiler is None:  # fallback to recent gfortran
             self.compiler = {'name': 'gfortran', 'version': 9}
@@ -76,21 +275,30 @@ class FortranLibrary:
             sys.path.append(self.path)
 
     def __dir__(self):
-        return sorted(self.methods)
+        symbols = self.__dict__.get('_symbols', {})
+        return sorted(symbols.get(None, self.methods))
 
     def __getattr__(self, attr):
-        if ('methods' in self.__dict__) and (attr in self.methods):
-            def method(*args):
-                return call_fortran(
-                    self._ffi, self._lib, attr, self.compiler, None, *args)
-            return method
+        # Global routines are bound on first access
+        symbol = self.__dict__.get('_symbols', {}).get(None, {}).get(attr)
+        if symbol and _is_routine(self._ffi, getattr(self._lib, symbol)):
+            self.methods.add(attr)
+            routine = self.routine(attr)
+            _bind(self, attr, routine)
+            return routine
         raise AttributeError('''Fortran library \'{}\' has no routine
                                 \'{}\'.'''.format(self.name, attr))
 
     def compile(self, tmpdir='.', verbose=0, debugflag=None,
-                skiplib=False, extra_objects=None):
+                skiplib=False, extra_objects=None, force=False):
         """
-        Compiles a Python extension as an interface for the Fortran module
+        Compiles a Python extension as an interface for the Fortran module.
+
+        Compilation is skipped if the build fingerprint stored next to the
+        extension matches, i.e. C source, compiler, flags and the library
+        itself are unchanged. With the cache enabled, extensions are
+        also reused from the shared build cache in `cache.cachedir()`.
+        Use `force=True` to always recompile.
         """
         ffi = FFI()
 
@@ -100,41 +308,133 @@ class FortranLibrary:
 
         extralinkargs = []
         if self.compiler['name'] in ('gfortran', 'ifort'):
-            extralinkargs.append('-Wl,-rpath,'+self.libpath)
+            # Look next to the extension first to allow relocation
+            if 'darwin' in sys.platform:
+                extralinkargs.append('-Wl,-rpath,@loader_path')
+            elif 'linux' in sys.platform:
+                extralinkargs.append('-Wl,-rpath,$ORIGIN')
         if self.compiler['name'] == 'gfortran' and 'darwin' not in sys.platform:
             extralinkargs.append('-lgfortran')
+        # Not part of the fingerprint, so that checkouts at other paths
+        # share cached extensions, which find the library via $ORIGIN
+        portablelinkargs = list(extralinkargs)
+        if self.compiler['name'] in ('gfortran', 'ifort'):
+            extralinkargs.append('-Wl,-rpath,'+self.libpath)
 
         if self.path:
             target = os.path.join(self.path, '_'+self.name+libexts[0])
         else:
             target = './_'+self.name+libexts[0]
-
-        structdef = arraydims(self.compiler)
-        descr = arraydescr(self.compiler)
-        for kdim in range(1, self.maxdim+1):
-            structdef += descr.format(kdim)
-
-        ffi.cdef(structdef+self.csource)
+        targetpath = os.path.join(tmpdir, target)
+
+        # Signatures are kept next to the extension for use by `load`
+        manifest = self.manifest()
+        manifestpath = manifest_path(os.path.dirname(targetpath), self.name)
+
+        if self.mode == 'abi':
+            log.debug('Nothing to compile in ABI mode')
+            write_manifest(manifestpath, manifest)
+            return
+
+        structdef = self.structdef()
+        batchdef, batchsource = self.batch_source()
+
+        buildfiles = list(extra_objects or [])
+        if not skiplib:
+            buildfiles.append(self.libfile)
+        fingerprint = build_fingerprint(
+            targetpath,
+            [structdef+self.csource+batchsource, self.compiler, self.maxdim,
+             skiplib, extraargs, portablelinkargs, debugflag,
+             platform_tag(), manifest],
+            buildfiles)
+
+        if (not force and fingerprint_matches(targetpath, fingerprint)
+                and os.path.exists(manifestpath)):
+            log.debug('Extension %s is up to date', targetpath)
+            return
+
+        cachedtarget = os.path.join(cache.cachedir(), 'build',
+                                    fingerprint['key'],
+                                    os.path.basename(targetpath))
+        if not force and cache.ENABLED and os.path.exists(cachedtarget):
+            log.debug('Reusing extension %s', cachedtarget)
+            copy_atomic(cachedtarget, targetpath)
+            cache.touch(cachedtarget)
+            write_manifest(manifestpath, manifest)
+            write_fingerprint(targetpath, fingerprint)
+            return
+
+        ffi.cdef(structdef+self.csource+batchdef)
 
         if skiplib:
             if extra_objects is None:
                 raise RuntimeError('Need extra_objects if skiplib=True')
             ffi.set_source('_'+self.name,
-                           structdef+self.csource,
+                           structdef+self.csource+batchsource,
                            extra_compile_args=extraargs,
                            extra_link_args=extralinkargs,
                            extra_objects=extra_objects)
         else:
             ffi.set_source('_'+self.name,
-                           structdef+self.csource,
+                           structdef+self.csource+batchsource,
                            libraries=[self.name],
                            library_dirs=['.', self.libpath],
                            extra_compile_args=extraargs,
                            extra_link_args=extralinkargs,
                            extra_objects=extra_objects)
 
-        debug('Compilation starting')
+        log.debug('Compilation starting')
         ffi.compile(tmpdir, verbose, target, debugflag)
+        write_manifest(manifestpath, manifest)
+        write_fingerprint(targetpath, fingerprint)
+
+        if cache.ENABLED:
+            try:
+                os.makedirs(os.path.dirname(cachedtarget), exist_ok=True)
+                copy_atomic(targetpath, cachedtarget)
+                cache.prune('build')
+            except OSError as err:
+                log.debug('Cannot store extension in cache: %s', err)
+
+    def manifest(self):
+        """
+        Returns C source and interfaces by module, as written next to the
+        extension by `compile` and read by `load`
+        """
+        def bymodule(items):
+            return sorted(items, key=lambda item: item[0] or '')
+
+        return {'version': MANIFEST_VERSION, 'compiler': self.compiler,
+                'csources': bymodule(self.csources.items()),
+                'interfaces': bymodule(self.interfaces.items())}
+
+    def structdef(self):
+        """
+        Returns C definitions of array descriptors up to rank maxdim
+        """
+        structdef = arraydims(self.compiler)
+        descr = arraydescr(self.compiler)
+        for kdim in range(1, self.maxdim+1):
+            structdef += descr.format(kdim)
+        return structdef
+
+    def batch_source(self):
+        """
+        Returns C declarations and definitions of loops for batched calls
+        of all routines with a signature from `fdef`
+        """
+        batchdef = ''
+        batchsource = ''
+        for module, known in sorted(self.interfaces.items(),
+                                    key=lambda item: item[0] or ''):
+            for name, signature in sorted(known['subprograms'].items()):
+                code = ccodegen_batch(
+                    mangle(self.compiler, module, name), signature)
+                if code is not None:
+                    batchdef += code[0]
+                    batchsource += code[1]
+        return batchdef, batchsource
 
     def load(self):
         """
@@ -145,37 +445,178 @@ class FortranLibrary:
             # TODO: add a check if the extension module itself is loaded.
             # Otherwise a new instance of a FortranModule makes you think
             # you can reload the extension module without warning.
-            warn('Library cannot be re-/unloaded unless Python is restarted.')
-
-        self._mod = importlib.import_module('_'+self.name)
-        self._ffi = self._mod.ffi
-        self._lib = self._mod.lib
-
+            log.warning('Library cannot be re-/unloaded unless Python is restarted.')
+
+        if self.mode == 'abi':
+            self._mod = None
+            manifest = read_manifest(
+                manifest_path(self.libpath, self.name), self.compiler)
+            self._add_manifest(manifest)
+            self._ffi = FFI()
+            self._ffi.cdef(self.structdef()+self.csource)
+            self._lib = self._ffi.dlopen(self.libfile)
+        else:
+            self._mod = importlib.import_module('_'+self.name)
+            manifest = read_manifest(
+                manifest_path(os.path.dirname(self._mod.__file__), self.name),
+                self.compiler)
+            self._add_manifest(manifest)
+            self._ffi = self._mod.ffi
+            self._lib = self._mod.lib
+        self._descriptors = DescriptorCache(self._ffi, self.compiler)
+
+        for mname in self.methods:
+            self.__dict__.pop(mname, None)
         self.methods = set()
-        ext_methods = dir(self._lib)
-        for m in ext_methods:
-            if not m.endswith('_'):
-                continue
-            mname = m.strip('_')
-            attr = getattr(self._lib, m)
-            debug('Name: {}, Type: {}, Callable: {}'.format(
-                mname, type(attr), callable(attr)))
-            if callable(attr):  # subroutine or function
-                self.methods.add(mname)
+
+        # Only record names here, symbols are resolved on first access
+        self._symbols = {}
+        for symbol in dir(self._lib):
+            names = demangle(self.compiler, symbol)
+            if names is not None:
+                self._symbols.setdefault(names[0], {})[names[1]] = symbol
+        _check_shadowed(self, self._symbols.get(None, {}))
 
         self.loaded = True
 
-    def cdef(self, csource):
+    def _add_manifest(self, manifest):
+        """
+        Adds signatures from the manifest written by `compile`. Signatures
+        given via `fdef` in this process take precedence.
+        """
+        if manifest is None:
+            return
+        log.debug('Using manifest of %s', self.name)
+        if self.mode == 'abi':  # declarations for cdef of other modules
+            for module, csource in manifest['csources']:
+                if module not in self.csources:
+                    self.cdef(csource, module)
+        known = self.interfaces
+        self.interfaces = {}
+        for module, moduleinterface in manifest['interfaces']:
+            self.add_interface(module, moduleinterface)
+        for module, moduleinterface in known.items():
+            self.add_interface(module, moduleinterface)
+
+    def routine(self, name, module=None):
+        """
+        Returns a callable bound to the Fortran routine `name`, using
+        the signature from `fdef` if available
+        """
+        signature = self.interfaces.get(module, {}).get(
+            'subprograms', {}).get(name)
+        routine = FortranRoutine(self._ffi, self._lib, name, self.compiler,
+                                 module, signature, self._descriptors)
+        self._routines.add(routine)
+        if self._profiling:
+            from . import profile
+            profile.enable(routine, self.profiler.stats_for(routine))
+        return routine
+
+    def profile(self, enabled=True):
+        """
+        Switches profiling of calls to routines on or off and returns the
+        Profile with timings by routine, readable via `as_dict` or `table`
+        and cleared by `reset`. Timings are kept when profiling is switched
+        off. Calls of routines that are not profiled have no overhead.
+        """
+        from . import profile
+
+        if enabled and self.profiler is None:
+            self.profiler = profile.Profile()
+        self._profiling = enabled
+        for routine in list(self._routines):
+            if enabled:
+                profile.enable(routine, self.profiler.stats_for(routine))
+            else:
+                profile.disable(routine)
+        return self.profiler
+
+    def variable(self, name, module):
         """
-        Specifies C source with suffix template replacements
+        Returns an accessor for the variable `name` in a Fortran module
+        """
+        signature = self.interfaces.get(module, {}).get(
+            'variables', {}).get(name)
+        dtype = None  # gfortran descriptors contain the type
+        if (self.compiler['name'] == 'ifort' and signature
+                and not signature['dtype'].startswith('type')):
+            dtype = numpy_dtype(signature)
+        return FortranVariable(self._ffi, self._lib, name, self.compiler,
+                               module, dtype)
+
+    def pool(self, workers=None, processes=False, method=None):
+        """
+        Returns the thread pool, or with `processes=True` the process pool
+        for concurrent calls. Pools are created on first use and recreated
+        if a different number of workers or start method is requested.
+        """
+        from .parallel import ProcessPool, ThreadPool
+
+        if not processes:
+            if self._pool is None or (workers and
+                                      workers != self._pool.workers):
+                if self._pool is not None:
+                    self._pool.shutdown()
+                self._pool = ThreadPool(workers)
+            return self._pool
+
+        if self._process_pool is None or (
+                workers and workers != self._process_pool.workers) or (
+                method and method != self._process_pool.method):
+            if self._process_pool is not None:
+                self._process_pool.shutdown()
+            self._process_pool = ProcessPool(self, workers, method)
+        return self._process_pool
+
+    def map(self, routine, *iterables, workers=None, chunksize=1,
+            processes=False):
+        """
+        Calls a routine, given by name or as bound routine, for arguments
+        from iterables concurrently. Threads require thread-safe routines,
+        while worker processes with `processes=True` each have their own
+        copy of module variables.
+        """
+        if isinstance(routine, str):
+            routine = getattr(self, routine)
+        return self.pool(workers, processes).map(routine, *iterables,
+                                                 chunksize=chunksize)
+
+    def starmap(self, routine, iterable, workers=None, chunksize=1,
+                processes=False):
+        """
+        Calls a routine with each tuple of arguments in iterable
+        concurrently in a thread or process pool like `map`
+        """
+        if isinstance(routine, str):
+            routine = getattr(self, routine)
+        return self.pool(workers, processes).starmap(routine, iterable,
+                                                     chunksize)
+
+    def cdef(self, csource, module=None):
+        """
+        Specifies C source with suffix template replacements, belonging
+        to `module` or to global routines if None
         """
         self.csource += csource
-        debug('C signatures are\n' + self.csource)
+        self.csources[module] = self.csources.get(module, '') + csource
+        log.debug('C signatures are\n%s', self.csource)
 
     def fdef(self, fsource):
-        ast = parse(fsource)
-        csource = ccodegen(ast, module=False)
+        csource, fortinterface = fortran_interface(
+            fsource, self.compiler, module=False)
         self.cdef(csource)
+        self.add_interface(None, fortinterface)
+
+    def add_interface(self, module, newinterface):
+        """
+        Merges signatures of subprograms, variables and types
+        into those known for `module`, or for global routines if None
+        """
+        known = self.interfaces.setdefault(
+            module, {'subprograms': {}, 'variables': {}, 'types': {}})
+        for key, value in newinterface.items():
+            known[key].update(value)
 
     def new(self, typename, value=None):
         typelow = typename.lower()  # Case-insensitive Fortran
@@ -198,63 +639,60 @@ class FortranLibrary:
 
 
 class FortranModule:
-    def __init__(self, library, name, maxdim=7, path=None, compiler=None):
+    def __init__(self, library, name, maxdim=7, path=None, compiler=None,
+                 mode='api'):
         if isinstance(library, str):
-            self.lib = FortranLibrary(library, maxdim, path, compiler)
+            self.lib = FortranLibrary(library, maxdim, path, compiler, mode)
         else:
             self.lib = library
         self.name = name
         self.methods = set()
         self.variables = set()
+        self._accessors = {}
         self.csource = ''
         self.loaded = False
 
     def __dir__(self):
-        return sorted(self.methods | self.variables)
+        names = self.__dict__.get('_names', self.methods | self.variables)
+        return sorted(names)
 
     def __getattr__(self, attr):
-        if ('methods' in self.__dict__) and (attr in self.methods):
-            def method(*args):
-                return call_fortran(self.lib._ffi, self.lib._lib,
-                                    attr, self.lib.compiler, self.name, *args)
-            return method
-        if ('variables' in self.__dict__) and (attr in self.variables):
-            return self.__get_var_fortran(attr)
+        if ('_accessors' in self.__dict__) and (attr in self._accessors):
+            return self._accessors[attr].get()
+        if attr in self.__dict__.get('_names', ()):
+            resolved = self._resolve(attr)
+            if isinstance(resolved, FortranVariable):
+                return resolved.get()
+            return resolved
         raise AttributeError('''Fortran module \'{}\' has no attribute
                                 \'{}\'.'''.format(self.name, attr))
 
     def __setattr__(self, attr, value):
-        if ('variables' in self.__dict__) and (attr in self.variables):
-            if self.lib.compiler['name'] == 'gfortran':
-                varname = '__'+self.name+'_MOD_'+attr
-            elif self.lib.compiler['name'] == 'ifort':
-                varname = self.name+'_mp_'+attr+'_'
-            else:
-                raise NotImplementedError(
-                    '''Compiler {} not supported. Use gfortran or ifort
-                    '''.format(self.compiler))
-            setattr(self.lib._lib, varname, value)
-        else:
-            super(FortranModule, self).__setattr__(attr, value)
-
-    def __get_var_fortran(self, var):
+        if (attr in self.__dict__.get('_names', ())
+                and attr not in self.methods):
+            resolved = self._resolve(attr)
+            if isinstance(resolved, FortranVariable):
+                resolved.set(value)
+                return
+        super(FortranModule, self).__setattr__(attr, value)
+
+    def _resolve(self, attr):
         """
-        Returns a Fortran variable based on its name
+        Classifies the symbol of `attr` on first access and returns
+        the bound routine or the accessor of the variable
         """
-        if self.lib.compiler['name'] == 'gfortran':
-            varname = '__'+self.name+'_MOD_'+var
-        elif self.lib.compiler['name'] == 'ifort':
-            varname = self.name+'_mp_'+var+'_'
-        else:
-            raise NotImplementedError(
-                '''Compiler {} not supported. Use gfortran or ifort
-                '''.format(self.lib.compiler))
-        var = getattr(self.lib._lib, varname)
-
-        if isinstance(var, self.lib._ffi.CData):  # array
-            return fortran2numpy(self.lib._ffi, var)
-
-        return var
+        if attr in self._accessors:
+            return self._accessors[attr]
+        symbol = getattr(self.lib._lib, self._names[attr])
+        log.debug('Name: %s, Type: %s', attr, type(symbol))
+        if _is_routine(self.lib._ffi, symbol):  # subroutine or function
+            self.methods.add(attr)
+            routine = self.lib.routine(attr, self.name)
+            _bind(self, attr, routine)
+            return routine
+        self.variables.add(attr)  # array or scalar variable
+        self._accessors[attr] = self.lib.variable(attr, self.name)
+        return self._accessors[attr]
 
     def cdef(self, csource):
         """
@@ -264,54 +702,65 @@ class FortranModule:
         """
         # GNU specific
         if self.lib.compiler['name'] == 'gfortran':
-            self.csource += csource.format(mod='__'+self.name+'_MOD',
-                                           suffix='')
+            csource = csource.format(mod='__'+self.name+'_MOD', suffix='')
         elif self.lib.compiler['name'] == 'ifort':
-            self.csource += csource.format(mod=self.name+'_mp',
-                                           suffix='_')
+            csource = csource.format(mod=self.name+'_mp', suffix='_')
         else:
             raise NotImplementedError(
                 '''Compiler {} not supported. Use gfortran or ifort
                 '''.format(self.lib.compiler))
-        debug('C signatures are\n' + self.csource)
-        self.lib.csource = self.lib.csource + self.csource
+        self.csource += csource
+        self.lib.cdef(csource, self.name)
 
     def fdef(self, fsource):
-        ast = parse(fsource)
-        csource = ccodegen(ast, module=True)
+        csource, fortinterface = fortran_interface(
+            fsource, self.lib.compiler, module=True)
         self.cdef(csource)
+        self.lib.add_interface(self.name, fortinterface)
 
     def load(self):
         if not self.lib.loaded:
             self.lib.load()
+        for mname in self.methods:
+            self.__dict__.pop(mname, None)
         self.methods = set()
-        ext_methods = dir(self.lib._lib)
-        for m in ext_methods:
-            if self.lib.compiler['name'] == 'gfortran':
-                mod_sym = '__{}_MOD_'.format(self.name)
-            elif self.lib.compiler['name'] == 'ifort':
-                mod_sym = '{}_mp_'.format(self.name)
-            else:
-                raise NotImplementedError(
-                    '''Compiler {} not supported. Use gfortran or ifort
-                    '''.format(self.compiler))
-            if not mod_sym in m:
-                continue
-            mname = re.sub(mod_sym, '', m)
-            if self.lib.compiler['name'] == 'ifort':
-                mname = mname.strip('_')
-            attr = getattr(self.lib._lib, m)
-            debug('Name: {}, Type: {}, Callable: {}'.format(
-                mname, type(attr), callable(attr)))
-            if isinstance(attr, self.lib._ffi.CData):  # array variable
-                self.variables.add(mname)
-            elif callable(attr):  # subroutine or function
-                self.methods.add(mname)
-            else:  # scalar variable
-                self.variables.add(mname)
+        self.variables = set()
+        self._accessors = {}
+        # Symbols are resolved and classified on first access
+        self._names = self.lib._symbols.get(self.name, {})
+        _check_shadowed(self, self._names)
+
+    def map(self, routine, *iterables, workers=None, chunksize=1,
+            processes=False):
+        """
+        Calls a routine, given by name or as bound routine, for arguments
+        from iterables concurrently, see `FortranLibrary.map`
+        """
+        if isinstance(routine, str):
+            routine = getattr(self, routine)
+        return self.lib.map(routine, *iterables, workers=workers,
+                            chunksize=chunksize, processes=processes)
+
+    def starmap(self, routine, iterable, workers=None, chunksize=1,
+                processes=False):
+        """
+        Calls a routine with each tuple of arguments in iterable
+        concurrently, see `FortranLibrary.map`
+        """
+        if isinstance(routine, str):
+            routine = getattr(self, routine)
+        return self.lib.starmap(routine, iterable, workers, chunksize,
+                                processes)
 
     def compile(self, tmpdir='.', verbose=0, debugflag=None):
         self.lib.compile(tmpdir, verbose, debugflag)
 
     def new(self, typename):
         return self.lib.new(typename)
+
+    def profile(self, enabled=True):
+        """
+        Switches profiling of the library on or off, see
+        `FortranLibrary.profile`
+        """
+        return self.lib.profile(enabled)
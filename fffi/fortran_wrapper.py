@@ -2,10 +2,17 @@
 Generate Python wrapper for given object files in Fortran
 """
 
+import logging
+import threading
+import weakref
+from functools import partial
+
 import numpy as np
 
 from cffi import FFI
-from .common import libexts, debug
+from .common import libexts
+
+log = logging.getLogger(__name__)
 
 
 def arraydims(compiler):
@@ -16,7 +23,7 @@ def arraydims(compiler):
               struct array_dims {
                 ptrdiff_t stride;
                 ptrdiff_t lower_bound;
-                ptrdiff_t extent;
+                ptrdiff_t upper_bound;
               };
 
               typedef struct datatype datatype;
@@ -42,8 +49,8 @@ def arraydims(compiler):
               typedef struct array_dims array_dims;
               struct array_dims {
                 uintptr_t extent;
-                uintptr_t distance;
-                uintptr_t lower_bound;
+                intptr_t distance;
+                intptr_t lower_bound;
               };
             """
     else:
@@ -58,7 +65,7 @@ def arraydescr(compiler):
               typedef struct array_{0}d array_{0}d;
               struct array_{0}d {{
                 void *base_addr;
-                size_t offset;
+                ptrdiff_t offset;
                 datatype dtype;
                 ptrdiff_t span;
                 struct array_dims dim[{0}];
@@ -68,7 +75,7 @@ def arraydescr(compiler):
             typedef struct array_{0}d array_{0}d;
             struct array_{0}d {{
             void *base_addr;
-            size_t offset;
+            ptrdiff_t offset;
             ptrdiff_t dtype;
             struct array_dims dim[{0}];
             }};
@@ -94,7 +101,7 @@ ctypemap = {
     ('int', None): 'int32_t',
     ('real', None): 'float',
     ('complex', None): 'float _Complex',
-    ('logical', None): '_Bool',
+    ('logical', None): 'int32_t',
     ('str', None): 'char',
     ('int', 1): 'int8_t',
     ('int', 2): 'int16_t',
@@ -104,17 +111,46 @@ ctypemap = {
     ('real', 8): 'double',
     ('complex', 4): 'float _Complex',
     ('complex', 8): 'double _Complex',
-    ('logical', 4): '_Bool'
+    ('logical', 4): 'int32_t'
+}
+
+# Map from C types to NumPy dtypes
+npdtypemap = {
+    'int8_t': 'i1',
+    'int16_t': 'i2',
+    'int32_t': 'i4',
+    'int64_t': 'i8',
+    'float': 'f4',
+    'double': 'f8',
+    'float _Complex': 'c8',
+    'double _Complex': 'c16',
+    '_Bool': 'b1',
+    'char': 'S1'
 }
 
-# Map for GCC datatypes
+# Map from NumPy dtypes to C types
+ctypes_of_dtype = {npdtype: ctype for ctype, npdtype in npdtypemap.items()}
+
+# Map from NumPy dtype kinds to GCC datatypes
+gfortran_types = {'i': 1, 'u': 1, 'b': 2, 'f': 3, 'c': 4, 'S': 6}
+
+# Map from GCC datatypes to NumPy dtype kinds, logical as integer
 dtypemap = {
-    1: 'integer',
-    2: 'logical',
-    3: 'real',
-    4: 'complex'
+    1: 'i',
+    2: 'i',
+    3: 'f',
+    4: 'c',
+    6: 'S'
 }
 
+# Flags of ifort array descriptors for arrays passed from NumPy
+IFORT_INFO = int('100001110', 2)
+IFORT_CONTIGUOUS = 0x4
+
+# Prefix of generated C functions for batched calls of Fortran routines
+BATCH_PREFIX = 'fffi_batch_'
+
+
 def ccodegen(ast, module):
     """Generates C signature for Fortran subprogram.
 
@@ -129,18 +165,17 @@ def ccodegen(ast, module):
     """
     csource = ''
     for typename, typedef in ast.types.items():  # types
-        debug('Adding type {}'.format(typename))
+        log.debug('Adding type %s', typename)
         csource += 'struct {} {{{{\n'.format(typename)
         for decl in typedef.declarations:
             for var in decl.namespace.values():
                 ctype, cdecl = c_declaration(var)
-                debug('{} {}'.format(ctype, cdecl))
+                log.debug('%s %s', ctype, cdecl)
                 csource += '{} {};\n'.format(ctype, cdecl)
         csource += '}};\n'
 
-    for subname, subp in ast.subprograms.items():  # subprograms
-        debug('Adding subprogram {}({})'.format(
-            subname, ', '.join(subp.args)))
+    for subname, subp in supported_subprograms(ast).items():  # subprograms
+        log.debug('Adding subprogram %s(%s)', subname, ', '.join(subp.args))
         csource += ccodegen_sub(subp, module)
 
     if module:  # module variables
@@ -171,7 +206,7 @@ def ccodegen_sub(subprogram, module=True):
         rank = attrs.rank
         shape = attrs.shape
         precision = attrs.precision
-        debug('{} rank={} bytes={}'.format(dtype, rank, precision))
+        log.debug('%s rank=%s bytes=%s', dtype, rank, precision)
 
         if dtype == 'str':
             nstr = nstr+1
@@ -182,9 +217,7 @@ def ccodegen_sub(subprogram, module=True):
         elif rank == 0:
             ctypename = ctypemap[(dtype, precision)]
         else:
-            if (shape is None
-                or shape[0] is None
-                    or shape[0][1] is None):  # Assumed size array
+            if assumed_shape(shape):  # Assumed size array
                 ctypename = 'array_{}d'.format(rank)
             else:  # Fixed size array
                 ctypename = ctypemap[(dtype, precision)]
@@ -197,34 +230,136 @@ def ccodegen_sub(subprogram, module=True):
     for kstr in range(nstr):
         cargs.append('size_t strlen{}'.format(kstr))
 
+    restype = result_ctype(subprogram.result)
+    name = subprogram.name.lower()  # as in symbols of compilers
+
     if module:  # subroutine in module
-        csource = 'extern void {{mod}}_{}{{suffix}}({});\n'.format(
-            subprogram.name, ', '.join(cargs))
+        csource = 'extern {} {{mod}}_{}{{suffix}}({});\n'.format(
+            restype, name, ', '.join(cargs))
     else:  # global subroutine
-        csource = 'extern void {}_({});\n'.format(
-            subprogram.name, ', '.join(cargs))
+        csource = 'extern {} {}_({});\n'.format(
+            restype, name, ', '.join(cargs))
 
     return csource
 
 
+def supported_subprograms(ast):
+    """
+    Returns subprograms of the AST that can be called via cffi, skipping
+    functions with results that are not returned by value
+    """
+    subprograms = {}
+    for subname, subp in ast.subprograms.items():
+        if subp.result is not None and not scalar_result(subp.result):
+            log.warning('Skipping function %s with %s result of rank %s',
+                        subname, subp.result.dtype, subp.result.rank)
+            continue
+        subprograms[subname] = subp
+    return subprograms
+
+
+def scalar_result(result):
+    return (result.rank == 0 and result.dtype != 'str'
+            and not result.dtype.startswith('type'))
+
+
+def result_ctype(result):
+    """
+    Returns the C return type for the result variable of a function,
+    or void for subroutines. Only scalar results of intrinsic types
+    except character are returned by value.
+    """
+    if result is None:
+        return 'void'
+    if not scalar_result(result):
+        raise NotImplementedError(
+            'Function result {} rank={}'.format(result.dtype, result.rank))
+    return ctypemap[(result.dtype, result.precision)]
+
+
+def ccodegen_batch(symbol, signature):
+    """Generates a C function calling a Fortran subroutine in a loop.
+
+    Each argument is passed as a pointer to its first instance and a step
+    in bytes to the next one, or a step of 0 to pass the same instance in
+    every call. For assumed-shape arrays the pointer is to the array
+    descriptor of the first slice, whose base address is advanced.
+
+    Parameters:
+        symbol (str): Symbol name of the subroutine in the library.
+        signature (dict): Interface of the subroutine.
+
+    Returns:
+        tuple: C declaration and definition of the function, or None
+               if the subroutine cannot be batched.
+
+    """
+    if signature.get('result') is not None:
+        return None  # results of functions would be discarded
+
+    cargs = ['ptrdiff_t n']
+    setup = []
+    loop = []
+    callargs = []
+    nstr = 0
+    for karg, arg in enumerate(signature['args']):
+        if arg['allocatable'] or arg['pointer']:
+            return None  # Fortran could change the descriptor
+
+        if arg['dtype'] == 'str':  # same string in each call
+            cargs.append('char *a{}'.format(karg))
+            callargs.append('a{}'.format(karg))
+            nstr = nstr+1
+            continue
+
+        cargs.append('void *a{0}, ptrdiff_t s{0}'.format(karg))
+        if arg['rank'] > 0 and assumed_shape(arg['shape']):
+            setup.append('array_{1}d d{0} = *(array_{1}d *)a{0};'.format(
+                karg, arg['rank']))
+            setup.append('char *b{0} = (char *)d{0}.base_addr;'.format(karg))
+            loop.append('d{0}.base_addr = b{0} + k*s{0};'.format(karg))
+            callargs.append('&d{}'.format(karg))
+        else:
+            callargs.append('(void *)((char *)a{0} + k*s{0})'.format(karg))
+
+    for kstr in range(nstr):
+        cargs.append('size_t strlen{}'.format(kstr))
+        callargs.append('strlen{}'.format(kstr))
+
+    cdecl = 'void {}{}({})'.format(BATCH_PREFIX, symbol, ', '.join(cargs))
+    loop.append('{}({});'.format(symbol, ', '.join(callargs)))
+    lines = ([cdecl + ' {'] + ['  ' + line for line in setup]
+             + ['  for (ptrdiff_t k = 0; k < n; k++) {']
+             + ['    ' + line for line in loop] + ['  }', '}'])
+    return cdecl + ';\n', '\n'.join(lines) + '\n'
+
+
+def assumed_shape(shape):
+    """
+    Returns True if an array of given shape is passed via array descriptor,
+    and False for explicit-shape arrays passed via pointer
+    """
+    return shape is None or shape[0] is None or shape[0][1] is None
+
+
 def c_declaration(var):
     # TODO: add support for derived types also here
     ctype = ctypemap[(var.dtype, var.precision)]
 
     # Scalars
     if var.rank == 0:
-        debug('Adding scalar {} ({})'.format(var.name, ctype))
+        log.debug('Adding scalar %s (%s)', var.name, ctype)
         return ctype, var.name.lower()
 
     # Assumed size arrays
 
-    if var.shape is None or var.shape[0] is None or var.shape[0][1] is None:
+    if assumed_shape(var.shape):
         return 'array_{}d'.format(var.rank), var.name.lower()
 
     # Fixed size arrays
 
     if var.rank == 1:
-        debug('Adding rank {} array {} ({})'.format(var.rank, var.name, ctype))
+        log.debug('Adding rank %s array %s (%s)', var.rank, var.name, ctype)
         length = var.shape[0][1]
         return ctype, '{}[{}]'.format(var.name.lower(), length)
     if var.rank > 1:
@@ -234,127 +369,699 @@ def c_declaration(var):
 
 
 
-def fortran2numpy(ffi, var):
-    # See https://gist.github.com/yig/77667e676163bbfc6c44af02657618a6
-    # TODO: add support for more types than real(8) and also assumed size
+def fortran2numpy(ffi, var, dtype=None):
+    """
+    Returns a NumPy view on a Fortran array without copying.
+
+    Parameters:
+        ffi: FFI instance of the library.
+        var: Fixed size array or array descriptor of any rank up to maxdim.
+        dtype: NumPy dtype of elements, required for ifort descriptors and
+               derived types, as their descriptors lack this information.
 
+    Returns:
+        np.ndarray: View with shape and strides of the Fortran array,
+                    or None if the array is not allocated/associated.
+
+    """
+    # See https://gist.github.com/yig/77667e676163bbfc6c44af02657618a6
     vartype = ffi.typeof(var)
 
-    # Fixed size array
     if vartype.kind == 'array':  # fixed size
-        ctype = vartype.item.cname
-        ptr = ffi.addressof(var)
-        size = ffi.sizeof(var)
-    elif vartype.kind == 'struct':
-        ptr = var.base_addr
-        dtype = dtypemap[var.dtype.type]
-        if var.dtype.type == 4:  # complex has twice the bytes
-            ctype = ctypemap[(dtype, var.dtype.len/2)]
-        else:
-            ctype = ctypemap[(dtype, var.dtype.len)]
-        
-        size = var.dtype.len*var.dim[0].extent # TODO: support >1D
-        dtype = var.dtype.type
-    else:
+        shape = []
+        itemtype = vartype
+        while itemtype.kind == 'array':  # nested for rank > 1
+            shape.append(itemtype.length)
+            itemtype = itemtype.item
+        if dtype is None:
+            dtype = npdtypemap[itemtype.cname]
+        return np.frombuffer(ffi.buffer(var), dtype).reshape(shape)
+
+    if vartype.kind != 'struct':
         raise NotImplementedError(f'''
         Array of kind {vartype.kind} not supported.
         ''')
-    
-    if ctype == 'double':
-        return np.frombuffer(ffi.buffer(ptr, size), 'f8')
-    elif ctype == 'double _Complex':
-        return np.frombuffer(ffi.buffer(ptr, size), 'c16')
-    raise NotImplementedError(f'''
-        Array of type {ctype} not supported.
-        ''')
+
+    if var.base_addr == ffi.NULL:
+        return None
+
+    fields = dict(vartype.fields)
+    ndims = len(var.dim)
+    offset = 0  # from base_addr to first element in bytes
+    if 'elem_size' in fields:  # ifort
+        if dtype is None:
+            raise TypeError('dtype needed for arrays from ifort')
+        itemsize = var.elem_size
+        shape = [var.dim[kd].extent for kd in range(ndims)]
+        strides = [var.dim[kd].distance for kd in range(ndims)]
+    else:  # gfortran
+        if 'span' in fields:  # version >= 8
+            typecode = var.dtype.type
+            itemsize = var.dtype.len
+            span = var.span or itemsize
+        else:
+            typecode = (var.dtype >> 3) & 7
+            itemsize = var.dtype >> 6
+            span = itemsize
+        shape = [var.dim[kd].upper_bound - var.dim[kd].lower_bound + 1
+                 for kd in range(ndims)]
+        strides = [var.dim[kd].stride*span for kd in range(ndims)]
+        offset = span*(var.offset + sum(
+            var.dim[kd].lower_bound*var.dim[kd].stride
+            for kd in range(ndims)))
+        if dtype is None:
+            if typecode not in dtypemap:
+                raise TypeError(
+                    'dtype needed for arrays of GCC type {}'.format(typecode))
+            dtype = '{}{}'.format(dtypemap[typecode], itemsize)
+
+    dtype = np.dtype(dtype)
+    shape = [max(extent, 0) for extent in shape]
+    if 0 in shape:
+        return np.empty(shape, dtype)
+
+    # Memory between the elements with lowest and highest address
+    low = sum(min(0, (extent - 1)*stride)
+              for extent, stride in zip(shape, strides))
+    high = sum(max(0, (extent - 1)*stride)
+               for extent, stride in zip(shape, strides)) + dtype.itemsize
+    start = ffi.cast('char*', var.base_addr) + offset + low
+    return np.ndarray(shape, dtype, buffer=ffi.buffer(start, high - low),
+                      offset=-low, strides=strides)
+
+
+def numpy_dtype(var):
+    """
+    Returns the NumPy dtype for a variable in an interface
+    """
+    return np.dtype(npdtypemap[ctypemap[(var['dtype'], var['precision'])]])
+
+
+def data_pointer(ffi, arr):
+    """
+    Returns the address of the data of a NumPy array as a void pointer
+    """
+    # The buffer protocol is much faster than arr.ctypes.data
+    if arr.flags.c_contiguous:
+        return ffi.cast('void*', ffi.from_buffer(arr))
+    if arr.flags.f_contiguous:
+        return ffi.cast('void*', ffi.from_buffer(arr.T))
+    return ffi.cast('void*', arr.__array_interface__['data'][0])
 
 
-def numpy2fortran(ffi, arr, compiler):
+class DescriptorCache:
     """
-    Converts Fortran-contiguous NumPy array arr into an array descriptor
-    compatible with gfortran to be passed to library routines via cffi.
+    Array descriptors of NumPy arrays that are reused in repeated calls.
+
+    An entry is valid while the array object is alive and keeps its shape,
+    strides and dtype, as the data address of an ndarray does not change
+    during its lifetime. Entries are removed when their array is deleted
+    or when more than maxsize arrays are cached. Changes of entries are
+    locked, as the cache is shared by threads calling routines.
     """
-    if not arr.flags.f_contiguous:
-        raise TypeError('needs Fortran order in NumPy arrays')
 
+    def __init__(self, ffi, compiler, maxsize=256):
+        self._ffi = ffi
+        self._compiler = compiler
+        self.maxsize = maxsize
+        self._entries = {}
+        # Reentrant, as weakref callbacks may run within a locked section
+        self._lock = threading.RLock()
+
+    def __call__(self, arr):
+        entry = self._entries.get(id(arr))
+        if (entry is not None and entry[0]() is arr and entry[1] == arr.shape
+                and entry[2] == arr.strides and entry[3] == arr.dtype):
+            return entry[4]
+
+        arrdata = numpy2fortran(self._ffi, arr, self._compiler)
+        key = id(arr)
+        ref = weakref.ref(arr, partial(self._remove, key))
+        with self._lock:
+            if len(self._entries) >= self.maxsize:  # evict oldest entry
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (ref, arr.shape, arr.strides, arr.dtype,
+                                  arrdata)
+        return arrdata
+
+    def _remove(self, key, ref):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is ref:  # not a reused id
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def numpy2fortran(ffi, arr, compiler, lower_bounds=None):
+    """
+    Converts NumPy array arr into an array descriptor compatible with
+    gfortran or ifort to be passed to library routines via cffi.
+
+    Strided views such as slices, arrays with negative strides and
+    C-ordered arrays are described via their strides without copying.
+    lower_bounds of the Fortran array default to 1 in each dimension.
+    """
     ndims = len(arr.shape)
+    itemsize = arr.dtype.itemsize
+    if lower_bounds is None:
+        lower_bounds = (1,)*ndims
+
     arrdata = ffi.new('array_{}d*'.format(ndims))
-    arrdata.base_addr = ffi.cast('void*', arr.ctypes.data)
+    arrdata.base_addr = data_pointer(ffi, arr)
     if compiler['name'] == 'gfortran':
-        arrdata.offset = 0
+        # gfortran strides are given in elements instead of bytes
+        strides = []
+        for stride in arr.strides:
+            if stride % itemsize:
+                raise TypeError(
+                    'strides of NumPy array must be multiples of item size')
+            strides.append(stride//itemsize)
+
+        # base_addr points to the element at the lower bounds
+        arrdata.offset = -sum(lb*stride
+                              for lb, stride in zip(lower_bounds, strides))
         if compiler['version'] >= 8:
-            arrdata.span = np.size(arr)*arr.dtype.itemsize
-            arrdata.dtype.len = arr.dtype.itemsize
+            arrdata.span = itemsize
+            arrdata.dtype.len = itemsize
             arrdata.dtype.ver = 0
             arrdata.dtype.rank = ndims
-            arrdata.dtype.type = 3  # "3" for float, TODO:others
+            arrdata.dtype.type = gfortran_types.get(arr.dtype.kind, 5)
             arrdata.dtype.attribute = 0
         else:
             arrdata.dtype = ndims  # rank of the array
-            arrdata.dtype = arrdata.dtype | (3 << 3)  # float: "3" TODO:others
-            arrdata.dtype = arrdata.dtype | (arr.dtype.itemsize << 6)
+            arrdata.dtype = arrdata.dtype | (
+                gfortran_types.get(arr.dtype.kind, 5) << 3)
+            arrdata.dtype = arrdata.dtype | (itemsize << 6)
 
-        stride = 1
         for kd in range(ndims):
-            arrdata.dim[kd].stride = stride
-            arrdata.dim[kd].lower_bound = 1
-            if compiler['version'] >= 8:
-                arrdata.dim[kd].extent = arr.shape[kd]
-            else:
-                arrdata.dim[kd].upper_bound = arr.shape[kd]
-            stride = stride*arr.shape[kd]
+            arrdata.dim[kd].stride = strides[kd]
+            arrdata.dim[kd].lower_bound = lower_bounds[kd]
+            arrdata.dim[kd].upper_bound = lower_bounds[kd] + arr.shape[kd] - 1
     elif compiler['name'] == 'ifort':
-        arrdata.elem_size = arr.dtype.itemsize
+        arrdata.elem_size = itemsize
         arrdata.reserved = 0
-        arrdata.info = int('100001110', 2)
+        arrdata.info = IFORT_INFO
+        if not arr.flags.f_contiguous:
+            arrdata.info &= ~IFORT_CONTIGUOUS
         arrdata.rank = ndims
         arrdata.reserved2 = 0
-        distance = arr.dtype.itemsize
         for kd in range(ndims):
-            arrdata.dim[kd].distance = distance
-            arrdata.dim[kd].lower_bound = 1
+            arrdata.dim[kd].distance = arr.strides[kd]  # in bytes
+            arrdata.dim[kd].lower_bound = lower_bounds[kd]
             arrdata.dim[kd].extent = arr.shape[kd]
-            distance = distance*arr.shape[kd]
 
     return arrdata
 
 
-def call_fortran(ffi, lib, function, compiler, module, *args):
+def mangle(compiler, module, name):
+    """Returns the compiler-specific symbol name of a Fortran routine
+    or module variable.
+
+    Parameters:
+        compiler (dict): Compiler name and version.
+        module (str): Name of the Fortran module, None for global routines.
+        name (str): Name of the routine or variable.
+
+    Returns:
+        str: Symbol name in the shared library.
+
     """
-    Calls a Fortran routine based on its name
+    if module is None:
+        return name + '_'
+    if compiler['name'] == 'gfortran':
+        return '__'+module+'_MOD_'+name
+    if compiler['name'] == 'ifort':
+        return module+'_mp_'+name+'_'
+    raise NotImplementedError(
+        '''Compiler {} not supported. Use gfortran or ifort
+        '''.format(compiler))
+
+
+def demangle(compiler, symbol):
+    """Returns the Fortran module and name of a symbol in a shared library.
+
+    Parameters:
+        compiler (dict): Compiler name and version.
+        symbol (str): Symbol name in the shared library.
+
+    Returns:
+        tuple: Module name, None for global routines, and name of the
+               routine or variable, or None if the symbol is not from Fortran.
+
+    """
+    if symbol.startswith(BATCH_PREFIX):
+        return None
+    if compiler['name'] == 'gfortran':
+        if symbol.startswith('__') and '_MOD_' in symbol:
+            module, name = symbol[2:].split('_MOD_', 1)
+            return module, name
+    elif compiler['name'] == 'ifort':
+        if '_mp_' in symbol and symbol.endswith('_'):
+            module, name = symbol[:-1].split('_mp_', 1)
+            return module, name
+    else:
+        raise NotImplementedError(
+            '''Compiler {} not supported. Use gfortran or ifort
+            '''.format(compiler))
+    if symbol.endswith('_'):
+        return None, symbol.strip('_')
+    return None
+
+
+def interface(ast):
+    """Extracts a compact signature model from the AST.
+
+    Parameters:
+        ast: AST containing Fortran types, variables, subroutines and/or functions.
+
+    Returns:
+        dict: Plain description of 'subprograms', 'variables' and 'types'
+              with lower-case names as keys.
+
+    """
+    return {
+        'subprograms': {
+            subname.lower(): {
+                'name': subname.lower(),
+                'args': [var_interface(subp.namespace[arg])
+                         for arg in subp.args],
+                'prefixes': subp.prefixes,
+                'result': (var_interface(subp.result)
+                           if subp.result is not None else None)
+            }
+            for subname, subp in ast.subprograms.items()
+            if subp.result is None or scalar_result(subp.result)
+        },
+        'variables': {
+            varname.lower(): var_interface(var)
+            for varname, var in ast.namespace.items()
+        },
+        'types': {
+            typename.lower(): [var_interface(var)
+                               for decl in typedef.declarations
+                               for var in decl.namespace.values()]
+            for typename, typedef in ast.types.items()
+        }
+    }
+
+
+def var_interface(var):
+    return {
+        'name': var.name.lower(),
+        'dtype': var.dtype,
+        'precision': var.precision,
+        'rank': var.rank,
+        'shape': var.shape,
+        'allocatable': var.allocatable,
+        'pointer': var.is_pointer,
+        'intent': var.intent
+    }
+
+
+def convert_str(ffi, arg):
+    return ffi.new("char[]", arg.encode('ascii'))
+
+
+def convert_scalar(ffi, arg):
+    if isinstance(arg, np.ndarray):  # 0-d array passed by address
+        if arg.ndim != 0 or arg.dtype.str[1:] not in ctypes_of_dtype:
+            raise TypeError('cannot pass {}D array of dtype {} as scalar'
+                            .format(arg.ndim, arg.dtype))
+        return ffi.from_buffer(ctypes_of_dtype[arg.dtype.str[1:]] + '[]', arg)
+    if isinstance(arg, int):
+        return ffi.new('int32_t*', arg)
+    if isinstance(arg, float):
+        return ffi.new('double*', arg)
+    return arg  # TODO: add more basic types
+
+
+def convert_array(ffi, arg, compiler, descriptors=None):
+    if isinstance(arg, np.ndarray):
+        if descriptors is not None:
+            return descriptors(arg)
+        return numpy2fortran(ffi, arg, compiler)
+    return arg
+
+
+def arg_converter(ffi, arg, compiler, descriptors=None, routine=''):
+    """
+    Returns a function that converts a Python value to a C argument
+    for the dummy argument `arg` of an interface
+    """
+    if arg['dtype'] == 'str':
+        return partial(convert_str, ffi)
+
+    if arg['dtype'].startswith('type'):  # cdata from FortranLibrary.new
+        return lambda value: value
+
+    ctype = ctypemap[(arg['dtype'], arg['precision'])]
+    name = '{}(): argument {}'.format(routine, arg['name'])
+
+    npdtype = numpy_dtype(arg)
+
+    if arg['rank'] == 0:
+        carray = ffi.typeof(ctype + '[]')
+        cptr = ffi.typeof(ctype + '*')
+        local = threading.local()  # scratch buffer for Python scalars
+
+        byaddress = (np.ndarray, ffi.CData)
+
+        def convert(value):
+            if isinstance(value, byaddress):
+                if not isinstance(value, np.ndarray):  # e.g. from lib.new
+                    return value
+                if value.dtype != npdtype or value.ndim != 0:
+                    raise TypeError('{} needs 0D array of dtype {}, got '
+                                    '{}D {}'.format(name, npdtype,
+                                                    value.ndim, value.dtype))
+                return ffi.from_buffer(carray, value)
+            try:
+                scratch = local.scratch
+            except AttributeError:  # first call in this thread
+                scratch = local.scratch = ffi.new(cptr)
+            try:
+                scratch[0] = value
+            except TypeError:
+                raise TypeError('{} needs {}, got {}'.format(
+                    name, ctype, type(value).__name__)) from None
+            return scratch
+        return convert
+
+    if not assumed_shape(arg['shape']):  # pass pointer to contiguous data
+        carray = ffi.typeof(ctype + '[]')
+
+        def convert(value):
+            if not isinstance(value, np.ndarray):
+                return value
+            if value.dtype != npdtype:
+                raise TypeError('{} needs dtype {}, got {}'.format(
+                    name, npdtype, value.dtype))
+            if value.flags.f_contiguous:
+                return ffi.from_buffer(carray, value.T)
+            raise TypeError('needs Fortran order in NumPy arrays')
+        return convert
+
+    # Fortran may change descriptors of allocatables and pointers
+    if descriptors is None or arg['allocatable'] or arg['pointer']:
+        descriptors = partial(numpy2fortran, ffi, compiler=compiler)
+    rank = arg['rank']
+
+    def convert(value):
+        if not isinstance(value, np.ndarray):
+            return value
+        if value.dtype != npdtype or value.ndim != rank:
+            raise TypeError('{} needs {}D array of dtype {}, got {}D {}'.format(
+                name, rank, npdtype, value.ndim, value.dtype))
+        return descriptors(value)
+    return convert
+
+
+def convert_batch(ffi, arg, value, compiler, axis=-1):
+    """
+    Converts a Python value to the pointer and step in bytes passed to a
+    batched call for the dummy argument `arg` of an interface.
+
+    Arrays with one dimension more than `arg` are stacked along `axis`,
+    and 1D arrays are stacked scalars. Other values are passed unchanged
+    in each call with a step of 0.
+
+    Returns:
+        tuple: C arguments and number of calls, or None if not stacked.
+
+    """
+    if arg['dtype'] == 'str':
+        return (convert_str(ffi, value),), None
+
+    if arg['dtype'].startswith('type'):
+        return (value, 0), None
+
+    name = 'argument {}'.format(arg['name'])
+    rank = arg['rank']
+    if not isinstance(value, np.ndarray):
+        if rank > 0:
+            raise TypeError('{} needs a NumPy array'.format(name))
+        if isinstance(value, ffi.CData):
+            return (value, 0), None
+        ctype = ctypemap[(arg['dtype'], arg['precision'])]
+        return (ffi.new(ctype + '*', value), 0), None
+
+    npdtype = numpy_dtype(arg)
+    if value.dtype != npdtype:
+        raise TypeError('{} needs dtype {}, got {}'.format(
+            name, npdtype, value.dtype))
+
+    if value.ndim == rank:  # same array in each call
+        first, step, count = value, 0, None
+    elif value.ndim == rank+1:
+        if rank == 0:
+            axis = 0
+        count = value.shape[axis]
+        step = value.strides[axis]
+        if count == 0:
+            return (ffi.NULL, 0), 0
+        first = np.moveaxis(value, axis, 0)[0, ...]  # view, also for rank 0
+    else:
+        raise TypeError('{} needs {}D or stacked {}D array, got {}D'.format(
+            name, rank, rank+1, value.ndim))
+
+    if rank > 0 and assumed_shape(arg['shape']):
+        return (numpy2fortran(ffi, first, compiler), step), count
+    if not first.flags.f_contiguous:
+        raise TypeError('{} needs Fortran order in each slice'.format(name))
+    return (data_pointer(ffi, first), step), count
+
+
+def nargs_error(name, expected, given):
+    """
+    Returns a TypeError for a call with the wrong number of arguments,
+    worded like the ones of Python
+    """
+    return TypeError('{}() takes {} positional argument{} but {} {} given'
+                     .format(name, expected, '' if expected == 1 else 's',
+                             given, 'was' if given == 1 else 'were'))
+
+
+def convert_args(ffi, args, compiler, descriptors=None):
+    """
+    Converts Python arguments to C arguments based on their Python types
     """
-    # TODO: scalars should be able to be either mutable 0d numpy arrays
-    # for in/out, or immutable Python types for pure input
-    # TODO: should be able to cast variables e.g. int/float if needed
     cargs = []
     cextraargs = []
     for arg in args:
         if isinstance(arg, str):
-            cargs.append(ffi.new("char[]", arg.encode('ascii')))
+            cargs.append(convert_str(ffi, arg))
             cextraargs.append(len(arg))
-        elif isinstance(arg, int):
-            cargs.append(ffi.new('int32_t*', arg))
-        elif isinstance(arg, float):
-            cargs.append(ffi.new('double*', arg))
-        elif isinstance(arg, np.ndarray):
-            cargs.append(numpy2fortran(ffi, arg, compiler))
-        else:  # TODO: add more basic types
-            cargs.append(arg)
-
-    if module is None:
-        funcname = function + '_'
-    else:
-        if compiler['name'] == 'gfortran':
-            funcname = '__'+module+'_MOD_'+function
-        elif compiler['name'] == 'ifort':
-            funcname = module+'_mp_'+function+'_'
+        elif isinstance(arg, np.ndarray) and arg.ndim > 0:
+            cargs.append(convert_array(ffi, arg, compiler, descriptors))
         else:
-            raise NotImplementedError(
-                '''Compiler {} not supported. Use gfortran or ifort
-                '''.format(compiler))
+            cargs.append(convert_scalar(ffi, arg))
+
+    return cargs + cextraargs
+
+
+def call_fortran(ffi, lib, function, compiler, module, *args):
+    """
+    Calls a Fortran routine based on its name
+    """
+    # TODO: should be able to cast variables e.g. int/float if needed
+    cargs = convert_args(ffi, args, compiler)
+    funcname = mangle(compiler, module, function)
     func = getattr(lib, funcname)
-    debug('Calling {}({})'.format(funcname, cargs))
-    func(*(cargs + cextraargs))
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('Calling %s(%s)', funcname, cargs)
+    return func(*cargs)
+
+
+class FortranRoutine:
+    """
+    Callable bound to a Fortran routine in a loaded library.
+
+    The symbol and the cffi function are resolved once on construction.
+    If a signature from `fdef` is given, the conversion of each argument is
+    prepared in advance. Otherwise arguments are converted based on their
+    Python types like in `call_fortran`. Array descriptors are taken from
+    the DescriptorCache `descriptors` if given. Functions with scalar
+    results return their value, with logicals as integers.
+
+    Scalar arguments given as 0-d NumPy arrays or pointers from
+    `FortranLibrary.new` are passed by address, so Fortran can change them.
+    Python scalars are written to a scratch buffer of the routine kept
+    for each thread.
+
+    Routines declared PURE or ELEMENTAL are marked as `threadsafe` and can
+    be called concurrently via `map` and `starmap` of their library or
+    module. Set `threadsafe` to mark other routines without shared state.
+    """
+
+    def __init__(self, ffi, lib, name, compiler, module=None, signature=None,
+                 descriptors=None):
+        self.name = name
+        self.module = module
+        self.symbol = mangle(compiler, module, name)
+        self.signature = signature
+        self.threadsafe = signature is not None and any(
+            prefix in ('pure', 'elemental')
+            for prefix in signature.get('prefixes', ()))
+        self._ffi = ffi
+        self._lib = lib
+        self._func = getattr(lib, self.symbol)
+        self._compiler = compiler
+        self._descriptors = descriptors
+        self._batch = getattr(lib, BATCH_PREFIX + self.symbol, None)
+
+        if signature is None:
+            self._converters = None
+            return
+
+        self._converters = [
+            arg_converter(ffi, arg, compiler, descriptors, name)
+            for arg in signature['args']]
+        self._strargs = [karg for karg, arg in enumerate(signature['args'])
+                         if arg['dtype'] == 'str']
+
+    def __call__(self, *args):
+        return self._func(*self._convert(args))
+
+    def _convert(self, args):
+        """
+        Returns C arguments for a call, shared with ProfiledRoutine
+        """
+        if self._converters is None:
+            return convert_args(
+                self._ffi, args, self._compiler, self._descriptors)
+
+        if len(args) != len(self._converters):
+            raise nargs_error(self.name, len(self._converters), len(args))
+
+        cargs = [conv(arg) for conv, arg in zip(self._converters, args)]
+        for karg in self._strargs:
+            cargs.append(len(args[karg]))
+        return cargs
+
+    def clone(self):
+        """
+        Returns a copy of the routine with its own descriptor cache,
+        e.g. for use in another thread
+        """
+        descriptors = None
+        if self._descriptors is not None:
+            descriptors = DescriptorCache(self._ffi, self._compiler,
+                                          self._descriptors.maxsize)
+        routine = FortranRoutine(self._ffi, self._lib, self.name,
+                                 self._compiler, self.module, self.signature,
+                                 descriptors)
+        routine.threadsafe = self.threadsafe
+        return routine
+
+    def batch(self, *args, axis=-1):
+        """
+        Calls the routine once for each slice of stacked arrays along `axis`
+        within a single C loop generated by `FortranLibrary.compile`.
+
+        Scalar arguments are stacked as 1D arrays. Arguments without the
+        extra dimension, Python scalars and strings are passed unchanged
+        in each call. Results are written to stacked output arrays.
+        """
+        if self._batch is None:
+            raise RuntimeError(
+                'No batched version of {}(). It requires a subroutine with '
+                'fdef signature before compile and no allocatable or '
+                'pointer arguments'
+                .format(self.name))
+
+        if len(args) != len(self.signature['args']):
+            raise nargs_error(self.name, len(self.signature['args']),
+                              len(args))
+
+        cargs = []
+        strlens = []
+        count = None
+        for arg, value in zip(self.signature['args'], args):
+            try:
+                carg, argcount = convert_batch(
+                    self._ffi, arg, value, self._compiler, axis)
+            except TypeError as err:
+                raise TypeError('{}(): {}'.format(self.name, err)) from None
+            cargs.extend(carg)
+            if arg['dtype'] == 'str':
+                strlens.append(len(value))
+            if argcount is None:
+                continue
+            if count is not None and argcount != count:
+                raise ValueError(
+                    '{}(): stacked arguments differ in length ({} and {})'
+                    .format(self.name, count, argcount))
+            count = argcount
+
+        if count is None:
+            raise TypeError(
+                '{}(): batch needs at least one stacked argument'.format(
+                    self.name))
+        if count > 0:
+            self._batch(count, *cargs, *strlens)
+
+    def __repr__(self):
+        return '<Fortran routine {}>'.format(self.name)
+
+
+class FortranVariable:
+    """
+    Accessor for a variable in a Fortran module of a loaded library.
+
+    The address of the variable is resolved once on construction. Views on
+    arrays are reused as long as the array descriptor is unchanged and
+    rebuilt when Fortran allocates, reallocates or reassociates the array.
+    """
+
+    def __init__(self, ffi, lib, name, compiler, module, dtype=None):
+        self.name = name
+        self.symbol = mangle(compiler, module, name)
+        self._ffi = ffi
+        self._ptr = ffi.addressof(lib, self.symbol)
+        self._dtype = dtype
+
+        vartype = ffi.typeof(self._ptr).item
+        self._scalar = vartype.kind not in ('array', 'struct')
+        self._descriptor = (vartype.kind == 'struct'
+                            and 'base_addr' in dict(vartype.fields))
+        self._state = None  # raw bytes of descriptor for cached view
+        self._view = None
+
+    def get(self):
+        if self._scalar:
+            return self._ptr[0]
+
+        if self._descriptor:
+            state = self._ffi.buffer(self._ptr)[:]
+            if state != self._state:
+                self._view = fortran2numpy(self._ffi, self._ptr[0],
+                                           self._dtype)
+                self._state = state
+            return self._view
+
+        if self._view is None:  # fixed size arrays never move
+            self._view = fortran2numpy(self._ffi, self._ptr[0], self._dtype)
+        return self._view
+
+    def set(self, value):
+        if self._scalar or isinstance(value, self._ffi.CData):
+            self._ptr[0] = value
+            return
+
+        view = self.get()
+        if view is None:
+            raise TypeError(
+                'Fortran array {} is not allocated'.format(self.name))
+        view[...] = value
+
+    def __repr__(self):
+        return '<Fortran variable {}>'.format(self.name)
 
 
 class FortranWrapper:
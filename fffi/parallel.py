@@ -0,0 +1,214 @@
+"""
+Concurrent calls of Fortran routines.
+
+cffi releases the GIL while a library routine runs, so that calls of
+routines without shared state, such as PURE or ELEMENTAL procedures,
+run in parallel within a pool of threads. Routines that keep state in
+module variables run in a pool of processes instead, each of which
+loads its own copy of the library.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from .shared import SharedHandle, is_shared, shared_array
+
+SHARE_THRESHOLD = 2**16  # bytes, larger arrays reach workers in shared memory
+
+
+class ThreadPool:
+    """
+    Pool of worker threads calling Fortran routines.
+
+    Each thread converts arguments with its own clone of a routine, so that
+    descriptor caches are never shared between threads. Work is submitted
+    in chunks of `chunksize` calls to reduce the overhead per call.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(self.workers,
+                                            thread_name_prefix='fffi')
+        self._local = threading.local()
+
+    def _clone(self, routine):
+        clones = getattr(self._local, 'clones', None)
+        if clones is None:
+            clones = self._local.clones = {}
+        clone = clones.get(id(routine))
+        # Clone again if profiling of the routine was switched since
+        if (clone is None or clone[0] is not routine
+                or type(clone[1]) is not type(routine)):
+            clone = clones[id(routine)] = (routine, routine.clone())
+        return clone[1]
+
+    def _run(self, routine, chunk):
+        clone = self._clone(routine)
+        return [clone(*args) for args in chunk]
+
+    def starmap(self, routine, iterable, chunksize=1):
+        """
+        Calls routine(*args) for each args in iterable and returns
+        the list of results in order
+        """
+        if not routine.threadsafe:
+            raise ValueError(
+                '{}() is not marked thread-safe. Declare it PURE or '
+                'ELEMENTAL in fdef or set its threadsafe attribute'
+                .format(routine.name))
+        if chunksize < 1:
+            raise ValueError('chunksize must be positive')
+
+        arglist = [tuple(args) for args in iterable]
+        futures = [
+            self._executor.submit(self._run, routine,
+                                  arglist[k:k+chunksize])
+            for k in range(0, len(arglist), chunksize)]
+
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def map(self, routine, *iterables, chunksize=1):
+        """
+        Calls routine with arguments from each of iterables like `map`
+        and returns the list of results in order
+        """
+        return self.starmap(routine, zip(*iterables), chunksize)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait)
+
+
+# State of a worker process: loaded library and its bound routines
+_worker = {}
+
+
+def _init_worker(name, maxdim, path, compiler, mode, csources, interfaces):
+    from .fffi import FortranLibrary
+    lib = FortranLibrary(name, maxdim, path, compiler, mode)
+    for module, csource in csources.items():  # for ABI mode
+        lib.cdef(csource, module)
+    lib.interfaces = interfaces
+    lib.load()
+    _worker['lib'] = lib
+    _worker['routines'] = {}
+
+
+def _call(routine, args, changed):
+    """
+    Calls routine in a worker process with shared arrays attached.
+    Returns the result and the array arguments at positions in `changed`
+    as changed by Fortran, or all of them if `changed` is None.
+    """
+    result = routine(*(arg.attach() if isinstance(arg, SharedHandle)
+                       else arg for arg in args))
+    return result, {karg: arg for karg, arg in enumerate(args)
+                    if isinstance(arg, np.ndarray)
+                    and (changed is None or karg in changed)}
+
+
+def _run_chunk(module, name, chunk, changed):
+    routines = _worker['routines']
+    if (module, name) not in routines:
+        routines[module, name] = _worker['lib'].routine(name, module)
+    return [_call(routines[module, name], args, changed) for args in chunk]
+
+
+def changed_args(routine):
+    """
+    Returns positions of arguments that Fortran may change according to
+    the signature of routine, i.e. all except intent(in), or None if
+    there is no signature
+    """
+    if routine.signature is None:
+        return None
+    return frozenset(karg for karg, arg in enumerate(routine.signature['args'])
+                     if arg['intent'] != 'in')
+
+
+class ProcessPool:
+    """
+    Pool of worker processes, each with its own copy of a Fortran library
+    and its module variables.
+
+    Workers are started with the `method` of multiprocessing, by default
+    forkserver where available, and load the compiled extension once.
+    SharedArrays from `shared_array` are passed by their handle without
+    copies. Other NumPy arguments larger than SHARE_THRESHOLD are copied
+    to shared memory and smaller ones are pickled. Changes to these
+    arrays by Fortran are copied back, except for intent(in) arguments.
+    """
+
+    def __init__(self, lib, workers=None, method=None):
+        if method is None:
+            methods = multiprocessing.get_all_start_methods()
+            method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self.workers = workers or os.cpu_count() or 1
+        self.method = method
+        self._executor = ProcessPoolExecutor(
+            self.workers, multiprocessing.get_context(method),
+            initializer=_init_worker,
+            initargs=(lib.name, lib.maxdim, os.path.abspath(lib.libpath),
+                      lib.compiler, lib.mode, lib.csources, lib.interfaces))
+
+    def starmap(self, routine, iterable, chunksize=1):
+        """
+        Calls routine(*args) for each args in iterable in worker processes
+        and returns the list of results in order
+        """
+        if chunksize < 1:
+            raise ValueError('chunksize must be positive')
+
+        changed = changed_args(routine)
+        arglist = [tuple(args) for args in iterable]
+        copies = []  # large arrays, their copies in shared memory, copy back
+        sentlist = []
+        for args in arglist:
+            sent = []
+            for karg, arg in enumerate(args):
+                if is_shared(arg):
+                    arg = arg.handle
+                elif (isinstance(arg, np.ndarray)
+                      and arg.nbytes > SHARE_THRESHOLD):
+                    order = 'C' if arg.flags.c_contiguous else 'F'
+                    copy = shared_array(arg.shape, arg.dtype, order)
+                    copy[...] = arg
+                    copies.append(
+                        (arg, copy, changed is None or karg in changed))
+                    arg = copy.handle
+                sent.append(arg)
+            sentlist.append(tuple(sent))
+
+        futures = [
+            self._executor.submit(_run_chunk, routine.module, routine.name,
+                                  sentlist[k:k+chunksize], changed)
+            for k in range(0, len(sentlist), chunksize)]
+
+        results = []
+        for future in futures:
+            results.extend(future.result())
+
+        for args, (_, arrays) in zip(arglist, results):
+            for karg, arr in arrays.items():
+                args[karg][...] = arr
+        for arr, copy, copyback in copies:
+            if copyback:
+                arr[...] = copy
+
+        return [result for result, _ in results]
+
+    def map(self, routine, *iterables, chunksize=1):
+        """
+        Calls routine with arguments from each of iterables like `map`
+        in worker processes and returns the list of results in order
+        """
+        return self.starmap(routine, zip(*iterables), chunksize)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait)
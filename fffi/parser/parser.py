@@ -28,7 +28,8 @@ class Variable():
                  cls_base=None,
                  cls_parameters=None,
                  order='C',
-                 precision=0):
+                 precision=0,
+                 intent=None):
 
         self.dtype = dtype
         self.name = name
@@ -38,6 +39,7 @@ class Variable():
         self.is_target = is_target
         self.shape = shape
         self.precision = precision
+        self.intent = intent
 
 
 # TODO: integrate again with pyccel
@@ -110,11 +112,34 @@ class InternalSubprogram(object):
         self.declarations = [stmt for stmt in self.statements if isinstance(stmt, Declaration)]
         self.name = self.heading.name
         self.args = self.heading.arguments
+        self.prefixes = [prefix.lower() for prefix in self.heading.prefixes]
         self.namespace = {}
 
         for decl in self.declarations:
             self.namespace = {**self.namespace, **decl.namespace}
 
+        self.result = None  # result variable of functions
+        if self.heading.kind:
+            suffix = self.heading.suffix
+            resname = suffix.name if suffix and suffix.name else self.name
+            # Fortran names are case-insensitive
+            declared = {name.lower(): (decl, var)
+                        for decl in self.declarations
+                        for name, var in decl.namespace.items()}
+            if self.heading.dtype is not None:
+                dtype, precision = result_type(self.heading.dtype)
+                self.result = Variable(dtype, resname, precision=precision)
+            elif resname.lower() in declared:
+                decl, self.result = declared[resname.lower()]
+                self.result.dtype, self.result.precision = result_type(
+                    decl.dtype)
+            else:  # implicit typing
+                implicit = 'integer' if resname[0].lower() in 'ijklmn' \
+                    else 'real'
+                dtype = dtype_registry[implicit][0]
+                self.result = Variable(dtype, resname,
+                                       precision=DEFAULT_KINDS[dtype])
+
 
 class SubprogramHeading(object):
     """Class representing a Fortran internal subprogram."""
@@ -153,20 +178,11 @@ class Declaration(object):
 
     def _build_namespace(self):
         self.namespace = {}
-        # ...
-        dtype = self.dtype.type
-
-        if isinstance(dtype, DerivedType):
-            dtype_type = 'type ' + dtype.name
-            precision = None
-        elif hasattr(dtype, 'kind') and dtype.kind:
-            precision = dtype.kind
-            dtype_type = dtype_registry[dtype.name.lower()][0]
-        else:
-            dtype_type, precision = dtype_registry[dtype.name.lower()]
+        dtype_type, precision = declaration_type(self.dtype)
 
         rank = 0
         shape = None
+        intent = None
         attributes = []
         for i in self.attributes:
             key = i.key.lower()
@@ -176,6 +192,8 @@ class Declaration(object):
                 d_infos = value.expr
                 shape = d_infos['shape']
                 rank = len(shape)
+            elif key == 'intent':
+                intent = value.lower()
             elif key == 'parameter':
                 #we don't add a parameter to the namespace
                 return
@@ -187,9 +205,11 @@ class Declaration(object):
 
         for ent in self.entities:
             localrank = rank
+            localshape = shape
             arrayspec = ent.arrayspec
-            if rank == 0 and (arrayspec is not None):
-                localrank = len(arrayspec.expr['shape'])
+            if arrayspec is not None:  # overrides dimension attribute
+                localshape = arrayspec.expr['shape']
+                localrank = len(localshape)
 
             var = Variable(dtype_type,
                            ent.name,
@@ -200,15 +220,49 @@ class Declaration(object):
                            is_target=is_target,
                            #                                is_polymorphic=,
                            #                                is_optional=,
-                           shape=shape,
+                           shape=localshape,
                            #                                cls_base=None,
                            #                                cls_parameters=None,
                            #                                order=,
-                           precision=precision
+                           precision=precision,
+                           intent=intent
                            )
             self.namespace[ent.name] = var
 
 
+def declaration_type(decltype):
+    """
+    Returns data type and precision of a DeclarationType
+    """
+    dtype = decltype.type
+
+    if isinstance(dtype, DerivedType):
+        return 'type ' + dtype.name, None
+    if hasattr(dtype, 'kind') and dtype.kind:
+        return dtype_registry[dtype.name.lower()][0], dtype.kind
+    return dtype_registry[dtype.name.lower()]
+
+
+# Kinds of intrinsic types without kind selector in Fortran. These are
+# used for function results, while dtype_registry maps REAL and COMPLEX
+# arguments to double precision.
+DEFAULT_KINDS = {'int': 4, 'real': 4, 'complex': 4}
+
+
+def result_type(decltype):
+    """
+    Returns data type and precision of a function result declared with a
+    DeclarationType, with default kinds if no kind is given
+    """
+    dtype = decltype.type
+
+    if (not isinstance(dtype, DerivedType)
+            and dtype.name.lower() in ('real', 'complex')
+            and not getattr(dtype, 'kind', None)):
+        return dtype.name.lower(), DEFAULT_KINDS[dtype.name.lower()]
+    return declaration_type(decltype)
+
+
 class DeclarationAttribute(object):
     """Class representing a Fortran declaration attribute."""
 
@@ -306,7 +360,17 @@ def ast_to_dict(ast):
 # ==============================================================================
 
 
-def parse(inputs, debug=False):
+_metamodels = {}
+
+
+def metamodel(debug=False):
+    """
+    Returns the textX metamodel for the Fortran grammar. It is built on
+    first use and reused for all later calls within the process.
+    """
+    if debug in _metamodels:
+        return _metamodels[debug]
+
     this_folder = dirname(__file__)
 
     # Get meta-model from language description
@@ -326,9 +390,15 @@ def parse(inputs, debug=False):
                DerivedType,
                DerivedTypeDefinition]
 
-    meta = metamodel_from_file(
+    _metamodels[debug] = metamodel_from_file(
         grammar, debug=debug, classes=classes, ignore_case=True)
 
+    return _metamodels[debug]
+
+
+def parse(inputs, debug=False):
+    meta = metamodel(debug)
+
     # Instantiate model
     if os.path.isfile(inputs):
         ast = meta.model_from_file(inputs)
@@ -0,0 +1,131 @@
+"""
+Opt-in profiling of calls to Fortran routines.
+
+`FortranLibrary.profile` switches bound routines to ProfiledRoutine, which
+records for each routine the number of calls, the total and maximum wall
+time per call, and how this time splits into the conversion of arguments
+including array descriptors and the foreign call itself. Routines that are
+not profiled are plain FortranRoutines without any timing code.
+"""
+
+from threading import Lock
+from time import perf_counter
+
+from .fortran_wrapper import FortranRoutine
+
+
+class RoutineStats:
+    """
+    Accumulated timings in seconds of calls to a single routine. Updates
+    are locked, as clones of a routine in different threads share stats.
+    """
+
+    __slots__ = ('calls', 'total', 'max', 'convert', 'foreign', '_lock')
+    fields = ('calls', 'total', 'max', 'convert', 'foreign')
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.total = 0.0
+            self.max = 0.0
+            self.convert = 0.0
+            self.foreign = 0.0
+
+    def add(self, convert, foreign):
+        """
+        Records a call with times for conversion and the foreign call
+        """
+        with self._lock:
+            self.calls += 1
+            self.total += convert + foreign
+            self.convert += convert
+            self.foreign += foreign
+            if convert + foreign > self.max:
+                self.max = convert + foreign
+
+    def as_dict(self):
+        with self._lock:
+            return {key: getattr(self, key) for key in self.fields}
+
+
+class Profile:
+    """
+    Timings of calls to Fortran routines of a library, by routine name
+    with its module as prefix `module.routine`
+    """
+
+    def __init__(self):
+        self.stats = {}
+
+    def stats_for(self, routine):
+        if routine.module is None:
+            name = routine.name
+        else:
+            name = '{}.{}'.format(routine.module, routine.name)
+        return self.stats.setdefault(name, RoutineStats())
+
+    def reset(self):
+        # Keep entries, as profiled routines hold references to them
+        for stats in self.stats.values():
+            stats.reset()
+
+    def as_dict(self):
+        return {name: stats.as_dict() for name, stats in self.stats.items()
+                if stats.calls}
+
+    def table(self):
+        """
+        Returns a table of timings with the most expensive routines first
+        """
+        lines = ['{:<32} {:>10} {:>12} {:>12} {:>12} {:>12}'.format(
+            'routine', 'calls', 'total [s]', 'max [s]', 'convert [s]',
+            'foreign [s]')]
+        for name, stats in sorted(self.stats.items(),
+                                  key=lambda item: -item[1].total):
+            if not stats.calls:
+                continue
+            lines.append(
+                '{:<32} {:>10} {:>12.6f} {:>12.6f} {:>12.6f} {:>12.6f}'
+                .format(name, stats.calls, stats.total, stats.max,
+                        stats.convert, stats.foreign))
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.table()
+
+
+class ProfiledRoutine(FortranRoutine):
+    """
+    FortranRoutine that records timings of each call in `_stats`
+    """
+
+    def __call__(self, *args):
+        start = perf_counter()
+        cargs = self._convert(args)
+        converted = perf_counter()
+        result = self._func(*cargs)
+        end = perf_counter()
+        self._stats.add(converted - start, end - converted)
+        return result
+
+    def clone(self):
+        routine = super().clone()
+        enable(routine, self._stats)
+        return routine
+
+
+def enable(routine, stats):
+    """
+    Switches a bound routine to profiling with timings recorded in `stats`
+    """
+    routine.__class__ = ProfiledRoutine
+    routine._stats = stats
+
+
+def disable(routine):
+    routine.__class__ = FortranRoutine
+    routine.__dict__.pop('_stats', None)
@@ -0,0 +1,119 @@
+"""
+NumPy arrays in shared memory to pass data between processes without copies.
+
+`shared_array` allocates a SharedArray backed by multiprocessing.shared_memory.
+Its `handle` is a small picklable reference that is sent to another process
+and reattached there, e.g. in workers of a ProcessPool, to let Fortran
+routines in several processes work on the same data.
+"""
+
+import os
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+class _Segment(SharedMemory):
+    """
+    Shared memory segment that is closed with the last array using it,
+    and removed from the system if it was created by this process
+    """
+
+    def __init__(self, name=None, size=0):
+        create = name is None
+        if create:
+            super().__init__(create=True, size=size)
+        else:
+            try:  # Python >= 3.13, the creator is responsible for unlinking
+                super().__init__(name=name, track=False)
+            except TypeError:
+                super().__init__(name=name)
+        self.owner = os.getpid() if create else None
+        self.addr = np.frombuffer(self.buf, np.uint8).ctypes.data
+
+    def __del__(self):
+        super().__del__()
+        if self.owner == os.getpid():
+            try:
+                self.unlink()
+            except OSError:
+                pass
+
+
+class SharedHandle:
+    """
+    Reference to a SharedArray by the name of its segment, layout and
+    position, to be reattached with `attach` in another process
+    """
+
+    def __init__(self, name, shape, dtype, strides, offset):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.strides = strides
+        self.offset = offset
+
+    def attach(self):
+        """
+        Returns a view on the shared array in the current process
+        """
+        return _view(_Segment(self.name), self.shape, self.dtype,
+                     self.strides, self.offset)
+
+    def __repr__(self):
+        return '<SharedHandle {} {} {}>'.format(
+            self.name, self.shape, np.dtype(self.dtype))
+
+
+class SharedArray(np.ndarray):
+    """
+    NumPy array in shared memory. Slices and other views are also shared
+    and can be passed to Fortran like any other NumPy array.
+    """
+
+    def __array_finalize__(self, obj):
+        self._segment = getattr(obj, '_segment', None)
+
+    @property
+    def handle(self):
+        """
+        Picklable SharedHandle of this array or view
+        """
+        segment = self._segment
+        offset = self.ctypes.data - segment.addr if segment else -1
+        if not 0 <= offset <= (segment.size if segment else -1):
+            raise ValueError('Array is not in shared memory')
+        return SharedHandle(segment.name, self.shape, self.dtype.str,
+                            self.strides, offset)
+
+
+def _view(segment, shape, dtype, strides, offset):
+    arr = np.ndarray(shape, dtype, buffer=segment.buf, offset=offset,
+                     strides=strides).view(SharedArray)
+    arr._segment = segment
+    return arr
+
+
+def shared_array(shape, dtype=float, order='F'):
+    """
+    Returns a new uninitialized SharedArray, by default in Fortran order.
+    Its memory is released when it and all of its views are deleted in
+    the creating process.
+    """
+    dtype = np.dtype(dtype)
+    shape = tuple(np.atleast_1d(shape).tolist())
+    segment = _Segment(size=max(int(np.prod(shape))*dtype.itemsize, 1))
+    strides = np.ndarray(shape, dtype, buffer=segment.buf,
+                         order=order).strides
+    return _view(segment, shape, dtype, strides, 0)
+
+
+def is_shared(arr):
+    """
+    Returns True if arr is a SharedArray that can be sent by its handle
+    """
+    try:
+        arr.handle
+    except (AttributeError, ValueError):
+        return False
+    return True
@@ -28,4 +28,26 @@ contains
     end do
   end subroutine test_array_2d
 
+  subroutine test_explicit(n, vec)
+    integer, intent(in) :: n
+    real(8), intent(inout) :: vec(n)
+
+    vec = 2d0*vec
+  end subroutine test_explicit
+
+  subroutine test_kinds(i8, r4, vec)
+    integer(8), intent(in) :: i8
+    real(4), intent(in) :: r4
+    real(4), intent(inout) :: vec(:)
+
+    vec = vec + i8*r4
+  end subroutine test_kinds
+
+  subroutine test_scalar(n, x)
+    integer, intent(in) :: n
+    real(8), intent(inout) :: x
+
+    x = n*x
+  end subroutine test_scalar
+
 end module mod_arrays
@@ -7,18 +7,50 @@ to generate CFFI API interface as a Python extension module
 """
 
 import gc
+import logging
 import os
 import subprocess
 import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 from shutil import copy
 
 import pytest
 import numpy as np
 from fffi import FortranModule
+from cffi import FFI
+from fffi.fortran_wrapper import (
+    IFORT_CONTIGUOUS, IFORT_INFO, FortranRoutine, arraydescr, arraydims,
+    call_fortran, convert_args, numpy2fortran)
 
 m = 3
 n = 2
 
+FDEF = """
+    subroutine test_vector(vec)
+    double precision, dimension(:) :: vec
+    end subroutine
+
+    subroutine test_array_2d(arr)
+    double precision, dimension(:,:) :: arr
+    end subroutine
+
+    subroutine test_explicit(n, vec)
+    integer :: n
+    real(8) :: vec(n)
+    end subroutine
+
+    subroutine test_kinds(i8, r4, vec)
+    integer(8) :: i8
+    real(4) :: r4
+    real(4) :: vec(:)
+    end subroutine
+
+    subroutine test_scalar(n, x)
+    integer :: n
+    real(8) :: x
+    end subroutine
+    """
+
 
 @pytest.fixture(scope='module')
 def tmp(tmp_path_factory):
@@ -65,16 +97,7 @@ def mod_arrays(tmp):
 
     fort_mod = FortranModule('test_arrays', 'mod_arrays', path=tmp)
 
-    fort_mod.fdef("""
-        subroutine test_vector(vec)
-        double precision, dimension(:) :: vec
-        end subroutine
-
-        subroutine test_array_2d(arr)
-        double precision, dimension(:,:) :: arr
-        end subroutine
-        """)
-
+    fort_mod.fdef(FDEF)
     fort_mod.compile()
 
     # recreate module to check if it works independently now
@@ -83,6 +106,15 @@ def mod_arrays(tmp):
     return fort_mod
 
 
+@pytest.fixture(scope='module')
+def mod_arrays_fdef(mod_arrays, tmp):
+    # module with signatures known from fdef, without recompilation
+    fort_mod = FortranModule('test_arrays', 'mod_arrays', path=tmp)
+    fort_mod.fdef(FDEF)
+    fort_mod.load()
+    return fort_mod
+
+
 def test_vector(mod_arrays, refvec):
     """
     Allocate vector in numpy, apply Fortran routine
@@ -105,16 +137,235 @@ def test_array_2d(mod_arrays, refarr):
     np.testing.assert_almost_equal(arr, refarr)
 
 
-# def test_array_2d_wrongorder(mod_arrays):
-#     """
-#     Allocate 2D array in numpy in wrong order, apply Fortran routine
-#     check if correct exception is thrown
-#     """
+def test_descriptor_cache(mod_arrays, refvec):
+    """
+    Reuse array descriptor in repeated calls, drop it with the array
+    """
+
+    descriptors = mod_arrays.lib._descriptors
+    descriptors.clear()
+    vec = np.ones(15)
+    mod_arrays.test_vector(vec)
+    arrdata = descriptors(vec)
+    vec[:] = 1.0
+    mod_arrays.test_vector(vec)
+    np.testing.assert_almost_equal(vec, refvec)
+    assert descriptors(vec) is arrdata
+    assert len(descriptors) == 1
 
-#     arr = np.ones((m, n), order='C')  # incorrect array order
-#     with self.assertRaises(TypeError) as context:
-#         self.mod_arrays.test_array_2d(arr)
-#     self.assertTrue('needs Fortran order' in str(context.exception))
+    del vec
+    assert len(descriptors) == 0
+
+
+def test_signature_vector(mod_arrays_fdef, refvec):
+    vec = np.ones(15)
+    mod_arrays_fdef.test_vector(vec)
+    np.testing.assert_almost_equal(vec, refvec)
+
+    with pytest.raises(TypeError, match='needs 1D array of dtype float64'):
+        mod_arrays_fdef.test_vector(np.ones(15, dtype=np.int64))
+
+
+def test_explicit(mod_arrays_fdef):
+    """
+    Explicit-shape arrays are passed as pointers to their data
+    """
+
+    vec = np.ones(15)
+    mod_arrays_fdef.test_explicit(15, vec)
+    np.testing.assert_almost_equal(vec, 2.0)
+
+    arr = np.ones((3, 5), order='F')
+    mod_arrays_fdef.test_explicit(15, arr)
+    np.testing.assert_almost_equal(arr, 2.0)
+
+    with pytest.raises(TypeError, match='needs Fortran order'):
+        mod_arrays_fdef.test_explicit(15, np.ones((3, 5), order='C'))
+
+
+def test_kinds(mod_arrays_fdef):
+    """
+    Scalars and arrays with non-default kinds
+    """
+
+    vec = np.ones(4, dtype=np.float32)
+    mod_arrays_fdef.test_kinds(2**33, 0.5, vec)
+    np.testing.assert_equal(vec, np.float32(1.0) + np.float32(2.0**32))
+
+    with pytest.raises(TypeError, match='needs int64_t'):
+        mod_arrays_fdef.test_kinds(0.5, 0.5, vec)
+
+
+def test_manifest(mod_arrays, tmp):
+    """
+    Signatures are read from the manifest written by compile, without fdef
+    """
+
+    fort_mod = FortranModule('test_arrays', 'mod_arrays', path=tmp)
+    fort_mod.load()
+    args = fort_mod.lib.interfaces['mod_arrays']['subprograms']['test_kinds'][
+        'args']
+    assert [arg['dtype'] for arg in args] == ['int', 'real', 'real']
+
+    vec = np.ones(15)
+    fort_mod.test_explicit(15, vec)
+    np.testing.assert_almost_equal(vec, 2.0)
+
+    with pytest.raises(TypeError, match='needs int64_t'):
+        fort_mod.test_kinds(0.5, 0.5, np.ones(4, dtype=np.float32))
+
+
+def test_scalar(mod_arrays_fdef):
+    """
+    0-d arrays and pointers are passed by address and changed in place
+    """
+
+    x = np.array(1.5)
+    mod_arrays_fdef.test_scalar(2, x)
+    mod_arrays_fdef.test_scalar(np.array(2, dtype=np.int32), x)
+    assert x == 6.0
+
+    ptr = mod_arrays_fdef.new('real(8)')
+    ptr[0] = 1.5
+    mod_arrays_fdef.test_scalar(3, ptr)
+    assert ptr[0] == 4.5
+
+    mod_arrays_fdef.test_scalar(2, 1.5)  # Python scalars in scratch buffer
+    with pytest.raises(TypeError, match='needs 0D array of dtype float64'):
+        mod_arrays_fdef.test_scalar(2, np.array(1, dtype=np.int64))
+    with pytest.raises(TypeError, match='needs int32_t'):
+        mod_arrays_fdef.test_scalar(2.0, x)
+
+    # without signature
+    ffi = mod_arrays_fdef.lib._ffi
+    n, cx = convert_args(ffi, [np.array(2, dtype=np.int32), x], None)
+    cx[0] = n[0]*cx[0]
+    assert x == 12.0
+
+
+def test_scalar_threads(mod_arrays_fdef, refvec):
+    """
+    Threads calling the same routine keep their own scalar inputs and
+    share the descriptor cache
+    """
+
+    def work(n):
+        for _ in range(2000):
+            x = np.array(1.0)
+            mod_arrays_fdef.test_scalar(n, x)
+            assert x == n
+            vec = np.ones(15)
+            mod_arrays_fdef.test_vector(vec)
+            np.testing.assert_almost_equal(vec, refvec)
+
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(work, range(1, 9)))
+
+
+def test_profile(mod_arrays, tmp):
+    """
+    Opt-in timings of calls split into conversion and foreign call
+    """
+
+    fort_mod = FortranModule('test_arrays', 'mod_arrays', path=tmp)
+    fort_mod.fdef(FDEF)
+    fort_mod.load()
+    vec = np.ones(15)
+    fort_mod.test_vector(vec)
+    assert type(fort_mod.test_vector) is FortranRoutine
+
+    profile = fort_mod.profile()
+    for _ in range(3):
+        fort_mod.test_vector(vec)
+    fort_mod.test_explicit(15, vec)  # bound after enabling
+
+    stats = profile.as_dict()
+    assert stats['mod_arrays.test_vector']['calls'] == 3
+    assert stats['mod_arrays.test_explicit']['calls'] == 1
+    for entry in stats.values():
+        assert entry['total'] >= entry['convert'] + entry['foreign']
+        assert entry['total'] >= entry['max'] > 0
+    assert 'mod_arrays.test_vector' in profile.table()
+
+    fort_mod.profile(False)
+    assert type(fort_mod.test_vector) is FortranRoutine
+    fort_mod.test_vector(vec)
+    assert profile.as_dict()['mod_arrays.test_vector']['calls'] == 3
+
+    profile.reset()
+    assert profile.as_dict() == {}
+
+
+def test_logging(mod_arrays, caplog):
+    """
+    Calls are logged to the logger of fffi only at debug level
+    """
+
+    lib = mod_arrays.lib
+    vec = np.ones(15)
+    with caplog.at_level(logging.INFO, logger='fffi'):
+        call_fortran(lib._ffi, lib._lib, 'test_vector', lib.compiler,
+                     'mod_arrays', vec)
+    assert not caplog.records
+
+    with caplog.at_level(logging.DEBUG, logger='fffi'):
+        call_fortran(lib._ffi, lib._lib, 'test_vector', lib.compiler,
+                     'mod_arrays', vec)
+    assert caplog.records[-1].name == 'fffi.fortran_wrapper'
+    assert caplog.records[-1].getMessage().startswith('Calling')
+
+
+def test_array_2d_corder(mod_arrays, refarr):
+    """
+    Allocate 2D array in numpy in C order, apply Fortran routine
+    without copying the array
+    """
+
+    arr = np.ones((m, n), order='C')
+    mod_arrays.test_array_2d(arr)
+    np.testing.assert_almost_equal(arr, refarr)
+
+
+def test_array_2d_strided(mod_arrays, refarr):
+    """
+    Apply Fortran routine on strided views, including negative strides
+    """
+
+    big = np.ones((2*m, 3*n), order='F')
+    mod_arrays.test_array_2d(big[::2, ::3])
+    np.testing.assert_almost_equal(big[::2, ::3], refarr)
+    big[::2, ::3] = 1.0
+    np.testing.assert_almost_equal(big, 1.0)
+
+    mod_arrays.test_array_2d(big[::-2, ::-1][:, :n])
+    np.testing.assert_almost_equal(big[::-2, ::-1][:, :n], refarr)
+
+
+def test_lower_bounds(mod_arrays):
+    ffi, compiler = mod_arrays.lib._ffi, mod_arrays.lib.compiler
+    arr = np.ones((m, n), order='F')
+    arrdata = numpy2fortran(ffi, arr, compiler, lower_bounds=(0, -1))
+    if compiler['name'] == 'gfortran':
+        assert arrdata.offset == m
+        assert arrdata.dim[1].lower_bound == -1
+        assert arrdata.dim[1].upper_bound == n - 2
+
+
+def test_ifort_contiguous():
+    """
+    ifort descriptors are only flagged contiguous for Fortran-ordered arrays
+    """
+
+    compiler = {'name': 'ifort', 'version': 18}
+    ffi = FFI()
+    ffi.cdef(arraydims(compiler) + arraydescr(compiler).format(2))
+
+    arr = np.ones((4, 3), order='F')
+    assert numpy2fortran(ffi, arr, compiler).info & IFORT_CONTIGUOUS
+    for view in (arr[::2, :], arr[::-1, :], np.ones((4, 3), order='C')):
+        arrdata = numpy2fortran(ffi, view, compiler)
+        assert not arrdata.info & IFORT_CONTIGUOUS
+        assert arrdata.info == IFORT_INFO & ~IFORT_CONTIGUOUS
 
 
 def test_array_2d_multi(mod_arrays, refarr):
@@ -149,3 +400,78 @@ def test_array_2d_multi(mod_arrays, refarr):
 
     stats = snapshot2.compare_to(snapshot1, 'filename')
     assert sum(stat.count_diff for stat in stats) <= statsum + 16
+
+
+def test_batch(mod_arrays_fdef, refarr):
+    """
+    Call routines on stacked arrays in a generated C loop
+    """
+
+    arrs = np.ones((m, n, 4), order='F')
+    mod_arrays_fdef.test_array_2d.batch(arrs)
+    for k in range(4):
+        np.testing.assert_almost_equal(arrs[:, :, k], refarr)
+
+    # stacked along the first axis, i.e. strided slices
+    arrs = np.ones((4, m, n))
+    mod_arrays_fdef.test_array_2d.batch(arrs, axis=0)
+    for k in range(4):
+        np.testing.assert_almost_equal(arrs[k], refarr)
+
+    # stacked scalars, array passed to each call
+    vecs = np.ones((3, 5), dtype=np.float32, order='F')
+    i8 = np.arange(5, dtype=np.int64)
+    mod_arrays_fdef.test_kinds.batch(i8, 0.5, vecs)
+    np.testing.assert_equal(vecs, np.tile(1.0 + 0.5*i8, (3, 1)))
+
+    with pytest.raises(ValueError, match='differ in length'):
+        mod_arrays_fdef.test_kinds.batch(i8, 0.5, vecs[:, :2])
+    with pytest.raises(TypeError, match='at least one stacked'):
+        mod_arrays_fdef.test_kinds.batch(1, 0.5, vecs[:, 0])
+
+    # explicit-shape arrays
+    vecs = np.ones((15, 3), order='F')
+    mod_arrays_fdef.test_explicit.batch(15, vecs)
+    np.testing.assert_equal(vecs, 2.0)
+
+
+def test_abi(mod_arrays, tmp, refvec, refarr):
+    """
+    Call routines in ABI mode without compiling an extension
+    """
+
+    mod_abi = FortranModule('test_arrays', 'mod_arrays', path=tmp,
+                            mode='abi')
+    mod_abi.fdef(FDEF)
+    mod_abi.compile()  # does nothing
+    mod_abi.load()
+
+    vec = np.ones(15)
+    mod_abi.test_vector(vec)
+    np.testing.assert_almost_equal(vec, refvec)
+
+    arr = np.ones((m, n), order='F')
+    mod_abi.test_array_2d(arr)
+    np.testing.assert_almost_equal(arr, refarr)
+
+    vec = np.ones(15)
+    mod_abi.test_explicit(15, vec)
+    np.testing.assert_almost_equal(vec, 2.0)
+
+    assert mod_abi.test_vector._batch is None
+
+
+def test_abi_manifest_other_module(mod_arrays, tmp):
+    """
+    In ABI mode, declarations of modules without fdef come from the
+    manifest even if other modules of the library have been declared
+    """
+
+    mod_abi = FortranModule('test_arrays', 'mod_arrays', path=tmp,
+                            mode='abi')
+    mod_abi.lib.cdef('void other_routine(void);', 'other')
+    mod_abi.load()
+
+    vec = np.ones(15)
+    mod_abi.test_explicit(15, vec)
+    np.testing.assert_almost_equal(vec, 2.0)
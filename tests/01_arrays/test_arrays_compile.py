@@ -5,8 +5,12 @@ Created: 2019-04-01
 Compiles CFF for test_arrays
 """
 
+import filecmp
 import os
 from shutil import copy
+
+import pytest
+from cffi import FFI
 from fffi import FortranModule
 
 def test_compile(tmp_path):
@@ -34,3 +38,101 @@ def test_compile(tmp_path):
     """)
 
     mod_arrays.compile(tmpdir=tmp_path, verbose=True)
+
+
+def test_compile_unchanged(tmp_path, monkeypatch):
+    monkeypatch.setenv('FFFI_CACHE_DIR', str(tmp_path / 'cache'))
+    cwd = os.path.dirname(__file__)
+
+    copy(os.path.join(cwd, 'Makefile'), tmp_path)
+    copy(os.path.join(cwd, 'mod_arrays.f90'), tmp_path)
+    copy(os.path.join(cwd, 'test_arrays.f90'), tmp_path)
+    os.mkdir(os.path.join(tmp_path, 'static'))
+    os.mkdir(os.path.join(tmp_path, 'shared'))
+
+    os.chdir(tmp_path)
+    os.system('make')
+
+    mod_arrays = FortranModule('test_arrays', 'mod_arrays', path=tmp_path)
+    mod_arrays.cdef("""
+        void {mod}_test_vector(array_1d *vec);
+    """)
+    mod_arrays.compile(tmpdir=tmp_path)
+
+    target = os.path.join(tmp_path, '_test_arrays.so')
+    manifest = os.path.join(tmp_path, '_test_arrays.manifest.json')
+    mtime = os.stat(target).st_mtime_ns
+    manifest_mtime = os.stat(manifest).st_mtime_ns
+
+    # Fingerprint matches, no recompilation and nothing written
+    mod_arrays.compile(tmpdir=tmp_path)
+    assert os.stat(target).st_mtime_ns == mtime
+    assert os.stat(manifest).st_mtime_ns == manifest_mtime
+
+    # Fresh checkout reuses extension from shared build cache
+    builddir = os.path.join(tmp_path, 'cache', 'build')
+    cached = os.path.join(builddir, os.listdir(builddir)[0], '_test_arrays.so')
+    os.utime(cached, (0, 0))
+    os.remove(target)
+    mod_arrays.compile(tmpdir=tmp_path)
+    assert os.path.exists(target)
+    assert os.stat(cached).st_mtime > 0  # marked as recently used
+
+    # Changed signatures trigger recompilation
+    mod_arrays.cdef("""
+        void {mod}_test_array_2d(array_2d *arr);
+    """)
+    mod_arrays.compile(tmpdir=tmp_path)
+    assert os.stat(target).st_mtime_ns != mtime
+
+
+def test_compile_cache_other_checkout(tmp_path, monkeypatch):
+    monkeypatch.setenv('FFFI_CACHE_DIR', str(tmp_path / 'cache'))
+    cwd = os.path.dirname(__file__)
+    checkouts = [tmp_path / 'a', tmp_path / 'b']
+    for checkout in checkouts:
+        os.mkdir(checkout)
+        copy(os.path.join(cwd, 'Makefile'), checkout)
+        copy(os.path.join(cwd, 'mod_arrays.f90'), checkout)
+        os.mkdir(checkout / 'shared')
+
+    os.chdir(checkouts[0])
+    os.system('make libtest_arrays.so')
+    copy(checkouts[0] / 'libtest_arrays.so', checkouts[1])
+
+    for checkout in checkouts:
+        mod_arrays = FortranModule('test_arrays', 'mod_arrays', path=checkout)
+        mod_arrays.cdef("""
+            void {mod}_test_vector(array_1d *vec);
+        """)
+        mod_arrays.compile(tmpdir=checkout)
+        # Second checkout restores from the build cache without compiling
+        monkeypatch.setattr(FFI, 'compile', pytest.fail)
+
+    assert filecmp.cmp(checkouts[0] / '_test_arrays.so',
+                       checkouts[1] / '_test_arrays.so', shallow=False)
+
+
+def test_compile_failed_no_manifest(tmp_path, monkeypatch):
+    monkeypatch.setenv('FFFI_CACHE_DIR', str(tmp_path / 'cache'))
+    cwd = os.path.dirname(__file__)
+
+    copy(os.path.join(cwd, 'Makefile'), tmp_path)
+    copy(os.path.join(cwd, 'mod_arrays.f90'), tmp_path)
+    os.mkdir(os.path.join(tmp_path, 'shared'))
+
+    os.chdir(tmp_path)
+    os.system('make libtest_arrays.so')
+
+    mod_arrays = FortranModule('test_arrays', 'mod_arrays', path=tmp_path)
+    mod_arrays.cdef("""
+        void {mod}_test_vector(array_1d *vec);
+    """)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('build failed')
+
+    monkeypatch.setattr(FFI, 'compile', fail)
+    with pytest.raises(RuntimeError, match='build failed'):
+        mod_arrays.compile(tmpdir=tmp_path)
+    assert not os.path.exists(tmp_path / '_test_arrays.manifest.json')
@@ -0,0 +1,79 @@
+import os
+import pytest
+from shutil import copy
+from fffi import FortranModule
+from fffi import cache, fffi
+
+FSOURCE = """\
+    subroutine test(x, y)
+        real(8) :: x
+        double precision, dimension(:) :: y
+    end subroutine
+    """
+
+
+@pytest.fixture(scope='module')
+def cwd():
+    return os.path.dirname(__file__)
+
+
+@pytest.fixture
+def fort_mod(tmp_path, cwd, monkeypatch):
+    monkeypatch.setenv('FFFI_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(cache, 'ENABLED', True)
+    copy(os.path.join(cwd, 'test_parser.f90'), tmp_path)
+    copy(os.path.join(cwd, 'Makefile'), tmp_path)
+    os.chdir(tmp_path)
+    os.system('make')
+    return FortranModule('test_parser', 'test_parser_mod', path=tmp_path)
+
+
+def test_cache_hit(fort_mod, monkeypatch):
+    fort_mod.fdef(FSOURCE)
+    csource = fort_mod.csource
+    interface = fort_mod.lib.interfaces['test_parser_mod']
+
+    def parse_fails(*args):
+        raise AssertionError('parse called despite cached result')
+
+    monkeypatch.setattr(fffi, 'parse', parse_fails)
+    fort_mod2 = FortranModule('test_parser', 'test_parser_mod',
+                              path=fort_mod.lib.path)
+    fort_mod2.fdef(FSOURCE)
+    assert fort_mod2.csource == csource
+    assert fort_mod2.lib.interfaces['test_parser_mod'] == interface
+
+
+def test_cache_disabled(fort_mod, monkeypatch):
+    monkeypatch.setattr(cache, 'ENABLED', False)
+    fort_mod.fdef(FSOURCE)
+    assert not os.path.exists(cache.cachedir())
+
+
+def test_cache_prune(fort_mod):
+    fort_mod.fdef(FSOURCE)
+    fort_mod.fdef(FSOURCE.replace('test', 'test2'))
+    assert len(os.listdir(os.path.join(cache.cachedir(), 'fdef'))) == 2
+    cache.prune(maxage=-1)
+    assert not os.listdir(os.path.join(cache.cachedir(), 'fdef'))
+
+
+def test_cache_prune_kinds(tmp_path, monkeypatch):
+    monkeypatch.setenv('FFFI_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(cache, 'ENABLED', True)
+    monkeypatch.setattr(cache, 'MAX_SIZE', {'fdef': 1024, 'build': 4096})
+
+    builddir = os.path.join(cache.cachedir(), 'build', 'key')
+    os.makedirs(builddir)
+    with open(os.path.join(builddir, '_test.so'), 'wb') as f:
+        f.write(b'\0'*2048)
+
+    # Storing fdef entries only evicts within their own limit
+    for k in range(4):
+        cache.store('fdef', str(k), 'x'*400)
+    assert len(os.listdir(os.path.join(cache.cachedir(), 'fdef'))) == 2
+    assert os.path.exists(os.path.join(builddir, '_test.so'))
+
+    # Directories of evicted builds are removed
+    cache.prune('build', maxsize=0)
+    assert not os.listdir(os.path.join(cache.cachedir(), 'build'))
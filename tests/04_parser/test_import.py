@@ -0,0 +1,42 @@
+"""
+The parser and textX are only imported when needed by fdef
+"""
+
+import os
+import subprocess
+import sys
+
+import fffi
+
+
+def imported(code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(fffi.__file__))]
+        + env.get('PYTHONPATH', '').split(os.pathsep))
+    output = subprocess.check_output([sys.executable, '-c', code + """
+import sys
+print(' '.join(sorted(sys.modules)))
+"""], env=env)
+    return output.decode().split()
+
+
+def test_lazy_import():
+    modules = imported('import fffi')
+    assert 'fffi.fffi' in modules
+    assert 'textx' not in modules
+    assert 'fffi.parser' not in modules
+    assert 'multiprocessing' not in modules
+
+
+def test_hasattr():
+    modules = imported(
+        'import fffi; assert not hasattr(fffi, "anything")')
+    assert 'textx' not in modules
+    assert 'Declaration' in dir(fffi)
+
+
+def test_parser_on_use():
+    assert 'textx' in imported('import fffi; fffi.parse("integer :: n")')
+    assert 'fffi.parser' in imported('from fffi import parser')
+    assert 'textx' in imported('from fffi import Declaration')
@@ -150,6 +150,21 @@ def test_array_types(fort_mod):
     assert fort_mod.csource
 
 
+def test_intent(fort_mod):
+    fort_mod.fdef("""\
+        subroutine test_intent(x, y, z, w)
+            real, intent(in) :: x
+            real, intent(out) :: y
+            real, intent(inout) :: z
+            real :: w
+        end subroutine
+        """)
+
+    args = fort_mod.lib.interfaces['test_parser_mod'][
+        'subprograms']['test_intent']['args']
+    assert [arg['intent'] for arg in args] == ['in', 'out', 'inout', None]
+
+
 def test_comment(fort_mod):
     fort_mod.fdef("""\
         ! Resonant transport regimes in tokamaks
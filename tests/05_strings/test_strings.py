@@ -53,3 +53,13 @@ def test_string(lib, refout):
     """
 
     lib.test_string('Hello, Fortran!')
+
+
+def test_string_nargs(lib):
+    """
+    Check number of arguments against the signature given by fdef
+    """
+
+    with pytest.raises(TypeError,
+                       match='takes 1 positional argument but 2 were given'):
+        lib.test_string('Hello', 'Fortran!')
@@ -0,0 +1,79 @@
+module mod_variables
+  implicit none
+
+  integer :: scalar_int = 42
+  real(8) :: scalar_real = 1.5d0
+  real(8) :: fixed(3)
+  real(8), allocatable :: a1(:)
+  real(8), allocatable :: a2(:,:)
+  real(4), allocatable :: a3(:,:,:)
+  integer, allocatable :: i2(:,:)
+  integer(8), allocatable :: i1(:)
+  complex(8), allocatable :: c2(:,:)
+  logical, allocatable :: l1(:)
+  real(8), allocatable, target :: t2(:,:)
+  real(8), pointer :: p2(:,:) => null()
+
+contains
+
+  subroutine init()
+    integer :: i, j, k
+
+    fixed = [1d0, 2d0, 3d0]
+
+    allocate(a1(5))
+    a1 = [(1d0*i, i = 1, 5)]
+
+    allocate(a2(3, 2))
+    allocate(i2(3, 2))
+    allocate(c2(3, 2))
+    allocate(t2(4, 6))
+    do j = 1, 2
+      do i = 1, 3
+        a2(i, j) = 10*i + j
+        i2(i, j) = 10*i + j
+        c2(i, j) = cmplx(i, j, 8)
+      end do
+    end do
+
+    allocate(a3(0:2, 2, 4))
+    do k = 1, 4
+      do j = 1, 2
+        do i = 0, 2
+          a3(i, j, k) = 100*i + 10*j + k
+        end do
+      end do
+    end do
+
+    allocate(i1(3))
+    i1 = 2_8**40
+
+    allocate(l1(4))
+    l1 = [.true., .false., .true., .false.]
+
+    do j = 1, 6
+      do i = 1, 4
+        t2(i, j) = 10*i + j
+      end do
+    end do
+    p2 => t2(4:1:-1, 1:6:2)
+  end subroutine init
+
+  subroutine double_a2()
+    a2 = 2d0*a2
+  end subroutine double_a2
+
+  subroutine reallocate_a2(m, n)
+    integer, intent(in) :: m, n
+
+    deallocate(a2)
+    allocate(a2(m, n))
+    a2 = 1d0
+  end subroutine reallocate_a2
+
+  subroutine finalize()
+    deallocate(a1, a2, a3, i2, i1, c2, l1, t2)
+    nullify(p2)
+  end subroutine finalize
+
+end module mod_variables
@@ -0,0 +1,154 @@
+"""
+Access to scalar and array variables in Fortran modules
+"""
+
+import os
+from shutil import copy
+
+import pytest
+import numpy as np
+from fffi import FortranModule
+
+FDEF = """
+    integer :: scalar_int
+    real(8) :: scalar_real
+    real(8) :: fixed(3)
+    real(8), allocatable :: a1(:)
+    real(8), allocatable :: a2(:,:)
+    real(4), allocatable :: a3(:,:,:)
+    integer, allocatable :: i2(:,:)
+    integer(8), allocatable :: i1(:)
+    complex(8), allocatable :: c2(:,:)
+    logical, allocatable :: l1(:)
+    real(8), allocatable, target :: t2(:,:)
+    real(8), pointer :: p2(:,:)
+
+    subroutine init()
+    end subroutine
+
+    subroutine double_a2()
+    end subroutine
+
+    subroutine reallocate_a2(m, n)
+      integer :: m, n
+    end subroutine
+
+    subroutine finalize()
+    end subroutine
+    """
+
+
+@pytest.fixture(scope='module')
+def tmp(tmp_path_factory):
+    return tmp_path_factory.mktemp('variables')
+
+
+@pytest.fixture(scope='module')
+def mod(tmp):
+    cwd = os.path.dirname(__file__)
+
+    copy(os.path.join(cwd, 'Makefile'), tmp)
+    copy(os.path.join(cwd, 'mod_variables.f90'), tmp)
+
+    os.chdir(tmp)
+    os.system('make')
+
+    fort_mod = FortranModule('test_variables', 'mod_variables', path=tmp)
+    fort_mod.fdef(FDEF)
+    fort_mod.compile()
+    fort_mod.load()
+    fort_mod.init()
+    return fort_mod
+
+
+def test_lazy(mod, tmp):
+    """
+    Symbols are classified on first access only
+    """
+    fort_mod = FortranModule('test_variables', 'mod_variables', path=tmp)
+    fort_mod.fdef(FDEF)
+    fort_mod.load()
+    assert not fort_mod.methods and not fort_mod.variables
+    assert {'init', 'a2', 'scalar_int'} <= set(dir(fort_mod))
+
+    init = fort_mod.init
+    assert fort_mod.init is init
+    assert fort_mod.methods == {'init'}
+    fort_mod.scalar_int
+    assert fort_mod.variables == {'scalar_int'}
+
+
+def test_scalars(mod):
+    assert mod.scalar_int == 42
+    assert mod.scalar_real == 1.5
+    mod.scalar_int = 43
+    assert mod.scalar_int == 43
+
+
+def test_fixed(mod):
+    np.testing.assert_equal(mod.fixed, [1.0, 2.0, 3.0])
+
+
+def test_arrays(mod):
+    k, l, n = np.meshgrid(np.arange(3), np.arange(2), np.arange(4),
+                          indexing='ij')
+    np.testing.assert_equal(mod.a1, np.arange(1.0, 6.0))
+    np.testing.assert_equal(mod.a2, 10*(k[:, :, 0] + 1) + l[:, :, 0] + 1)
+    np.testing.assert_equal(mod.i2, 10*(k[:, :, 0] + 1) + l[:, :, 0] + 1)
+    np.testing.assert_equal(mod.c2, (k[:, :, 0] + 1) + 1j*(l[:, :, 0] + 1))
+    np.testing.assert_equal(mod.a3, 100*k + 10*(l + 1) + n + 1)
+    np.testing.assert_equal(mod.i1, 2**40)
+    np.testing.assert_equal(mod.l1 != 0, [True, False, True, False])
+
+    assert mod.a3.dtype == np.float32
+    assert mod.i2.dtype == np.int32
+    assert mod.i1.dtype == np.int64
+    assert mod.a2.flags.f_contiguous
+
+
+def test_pointer(mod):
+    np.testing.assert_equal(mod.p2, mod.t2[::-1, ::2])
+
+
+def test_view(mod):
+    """
+    Changes are seen on both sides without copying
+    """
+    a2 = mod.a2
+    a2[0, 1] = -1.0
+    ref = 2*a2
+    mod.double_a2()
+    np.testing.assert_equal(a2, ref)
+    np.testing.assert_equal(mod.a2, ref)
+
+
+def test_cached_view(mod):
+    """
+    Repeated access returns the same view until Fortran reallocates
+    """
+    a2 = mod.a2
+    assert mod.a2 is a2
+    assert mod.fixed is mod.fixed
+
+    mod.reallocate_a2(4, 5)
+    assert mod.a2 is not a2
+    assert mod.a2.shape == (4, 5)
+    np.testing.assert_equal(mod.a2, 1.0)
+
+    mod.a2 = 2.0
+    np.testing.assert_equal(mod.a2, 2.0)
+
+
+def test_abi(mod, tmp):
+    """
+    Module variables in ABI mode refer to the same memory
+    """
+    mod_abi = FortranModule('test_variables', 'mod_variables', path=tmp,
+                            mode='abi')
+    mod_abi.fdef(FDEF)
+    mod_abi.load()
+
+    mod_abi.scalar_int = 7
+    assert mod.scalar_int == 7
+    np.testing.assert_equal(mod_abi.a2, mod.a2)
+    np.testing.assert_equal(mod_abi.p2, mod.p2)
@@ -0,0 +1,27 @@
+module mod_parallel
+  implicit none
+
+  integer :: counter = 0
+
+contains
+
+  pure subroutine square(x, y)
+    real(8), intent(in) :: x(:)
+    real(8), intent(out) :: y(:)
+
+    y = x**2
+  end subroutine square
+
+  subroutine increment(n)
+    integer, intent(in) :: n
+
+    counter = counter + n
+  end subroutine increment
+
+  subroutine get_counter(c)
+    integer, intent(out) :: c(:)
+
+    c = counter
+  end subroutine get_counter
+
+end module mod_parallel
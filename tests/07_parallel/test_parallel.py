@@ -0,0 +1,181 @@
+"""
+Concurrent calls of thread-safe routines in a thread pool
+"""
+
+import multiprocessing
+import os
+import sys
+from shutil import copy
+
+import pytest
+import numpy as np
+from fffi import FortranModule, parallel, shared_array
+
+
+@pytest.fixture(scope='module')
+def tmp(tmp_path_factory):
+    return tmp_path_factory.mktemp('parallel')
+
+
+@pytest.fixture(scope='module')
+def mod(tmp):
+    cwd = os.path.dirname(__file__)
+
+    copy(os.path.join(cwd, 'Makefile'), tmp)
+    copy(os.path.join(cwd, 'mod_parallel.f90'), tmp)
+
+    os.chdir(tmp)
+    os.system('make')
+
+    fort_mod = FortranModule('test_parallel', 'mod_parallel', path=tmp)
+    fort_mod.fdef("""
+        integer :: counter
+
+        pure subroutine square(x, y)
+          real(8), intent(in) :: x(:)
+          real(8), intent(out) :: y(:)
+        end subroutine
+
+        subroutine increment(n)
+          integer, intent(in) :: n
+        end subroutine
+
+        subroutine get_counter(c)
+          integer, intent(out) :: c(:)
+        end subroutine
+        """)
+    fort_mod.compile()
+    fort_mod.load()
+    return fort_mod
+
+
+def test_threadsafe(mod):
+    assert mod.square.threadsafe
+    assert not mod.increment.threadsafe
+
+
+@pytest.mark.parametrize('chunksize', [1, 3, 100])
+def test_map(mod, chunksize):
+    xs = [np.arange(float(k)) for k in range(10)]
+    ys = [np.empty_like(x) for x in xs]
+    results = mod.map('square', xs, ys, workers=4, chunksize=chunksize)
+    assert results == [None]*10
+    for x, y in zip(xs, ys):
+        np.testing.assert_equal(y, x**2)
+
+
+def test_starmap(mod):
+    args = [(np.full(5, float(k)), np.zeros(5)) for k in range(20)]
+    mod.starmap(mod.square, args, workers=2)
+    for x, y in args:
+        np.testing.assert_equal(y, x**2)
+
+
+def test_profile_threads(mod):
+    """
+    Calls of clones in all threads are counted in the library's profile
+    """
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often to expose races
+    profile = mod.profile()
+    try:
+        args = [(np.ones(2), np.zeros(2)) for _ in range(4000)]
+        mod.starmap(mod.square, args, workers=4)
+    finally:
+        mod.profile(False)
+        sys.setswitchinterval(interval)
+    assert profile.as_dict()['mod_parallel.square']['calls'] == 4000
+
+
+def test_profile_pool_used_before(mod):
+    """
+    Clones cached by a thread pool before profiling are profiled as well
+    """
+    args = [(np.ones(2), np.zeros(2)) for _ in range(8)]
+    mod.starmap(mod.square, args, workers=2)
+    profile = mod.profile()
+    profile.reset()
+    try:
+        mod.starmap(mod.square, args, workers=2)
+    finally:
+        mod.profile(False)
+    assert profile.as_dict()['mod_parallel.square']['calls'] == 8
+
+    mod.starmap(mod.square, args, workers=2)  # no longer profiled
+    assert profile.as_dict()['mod_parallel.square']['calls'] == 8
+
+
+def test_not_threadsafe(mod):
+    with pytest.raises(ValueError, match='not marked thread-safe'):
+        mod.map('increment', [1, 2, 3])
+
+
+@pytest.mark.parametrize('size', [10, 100000])
+def test_processes(mod, size):
+    """
+    Changes to small and large arrays, the latter passed in shared memory,
+    reach the calling process. Read-only intent(in) arrays are accepted.
+    """
+    xs = [np.full(size, float(k)) for k in range(6)]
+    ys = [np.zeros(size) for _ in xs]
+    for x in xs:
+        x.flags.writeable = False
+    assert (xs[0].nbytes > parallel.SHARE_THRESHOLD) == (size > 10)
+    mod.map('square', xs, ys, workers=2, chunksize=2, processes=True)
+    for x, y in zip(xs, ys):
+        np.testing.assert_equal(y, x**2)
+
+
+def test_processes_state(mod):
+    """
+    Each worker process has its own module variables
+    """
+    mod.counter = 0
+    mod.map('increment', [1]*8, workers=1, processes=True)
+    assert mod.counter == 0
+
+    counter = np.zeros(1, dtype=np.int32)
+    mod.map('get_counter', [counter], workers=1, processes=True)
+    assert counter[0] == 8
+
+
+def fill(handle, value):
+    handle.attach()[...] = value
+
+
+def test_shared_array():
+    """
+    Changes via a reattached handle are seen in the creating process
+    """
+    arr = shared_array((4, 3))
+    assert arr.flags.f_contiguous
+    arr[...] = 0.0
+
+    ctx = multiprocessing.get_context('spawn')
+    proc = ctx.Process(target=fill, args=(arr[1:3, ::2].handle, 2.0))
+    proc.start()
+    proc.join()
+    assert proc.exitcode == 0
+    np.testing.assert_equal(arr[1:3, ::2], 2.0)
+    assert arr.sum() == 8.0
+
+    with pytest.raises(ValueError, match='not in shared memory'):
+        (arr + 1).handle
+
+
+def test_shared_processes(mod):
+    """
+    Shared arrays are passed to Fortran directly and to worker processes
+    by their handle
+    """
+    xs = [shared_array(1000) for _ in range(4)]
+    ys = [shared_array(1000) for _ in range(4)]
+    for k, x in enumerate(xs):
+        x[...] = k
+
+    mod.square(xs[0], ys[0])
+    np.testing.assert_equal(ys[0], 0.0)
+
+    mod.map('square', xs, ys, workers=2, processes=True)
+    for x, y in zip(xs, ys):
+        np.testing.assert_equal(y, x**2)
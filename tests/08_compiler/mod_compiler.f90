@@ -0,0 +1,9 @@
+module mod_compiler
+  implicit none
+
+contains
+
+  subroutine noop()
+  end subroutine noop
+
+end module mod_compiler
@@ -0,0 +1,67 @@
+"""
+Detection of the compiler of a library from its identification strings
+"""
+
+import os
+import subprocess
+from shutil import copy
+
+import pytest
+from fffi import FortranLibrary, compiler
+
+
+@pytest.fixture(scope='module')
+def libfile(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('compiler')
+    cwd = os.path.dirname(__file__)
+
+    copy(os.path.join(cwd, 'Makefile'), tmp)
+    copy(os.path.join(cwd, 'mod_compiler.f90'), tmp)
+
+    os.chdir(tmp)
+    os.system('make')
+    return os.path.join(tmp, 'libtest_compiler.so')
+
+
+def test_elf(libfile):
+    version = subprocess.check_output(['gfortran', '-dumpversion'])
+    major = int(version.decode().split('.')[0])
+
+    assert any(b'GCC' in line for line in compiler.read_comment(libfile))
+    assert compiler.detect_compiler(libfile) == {
+        'name': 'gfortran', 'version': major}
+    assert FortranLibrary(
+        'test_compiler', path=os.path.dirname(libfile)).compiler == {
+            'name': 'gfortran', 'version': major}
+
+
+def test_cached(libfile, monkeypatch):
+    detected = compiler.detect_compiler(libfile)
+
+    def read_fails(path):
+        raise AssertionError('library read despite cached result')
+
+    monkeypatch.setattr(compiler, 'read_comment', read_fails)
+    assert compiler.detect_compiler(libfile) == detected
+
+
+def test_scan(tmp_path):
+    """
+    Files other than ELF are scanned for identification strings
+    """
+    path = tmp_path / 'libother.dylib'
+    path.write_bytes(b'\xcf\xfa\xed\xfe\0\0GCC: (Homebrew GCC 13.2.0) 13.2.0\0')
+    assert compiler.read_comment(str(path)) is None
+    assert compiler.detect_compiler(str(path)) == {
+        'name': 'gfortran', 'version': 13}
+
+
+def test_identify():
+    assert compiler.identify([
+        b'GCC: (GNU) 4.8.5 20150623 (Red Hat 4.8.5-39)',
+        b'Intel(R) Fortran Intel(R) 64 Compiler for applications running '
+        b'on Intel(R) 64, Version 18.0.3.222 Build 20180410']) == {
+            'name': 'ifort', 'version': 18}
+    assert compiler.identify([b'flang version 17.0.6']) == {
+        'name': 'flang', 'version': 17}
+    assert compiler.identify([b'clang version 17.0.6']) is None
@@ -0,0 +1,65 @@
+module mod_functions
+  implicit none
+
+contains
+
+  pure function norm(vec)
+    real(8), intent(in) :: vec(:)
+    real(8) :: norm
+
+    norm = sqrt(sum(vec**2))
+  end function norm
+
+  integer(8) function total(n) result(s)
+    integer, intent(in) :: n
+    integer :: k
+
+    s = 0
+    do k = 1, n
+      s = s + k
+    end do
+  end function total
+
+  real(4) function half(x)
+    real(4), intent(in) :: x
+
+    half = x/2
+  end function half
+
+  real function twice(x)
+    real(4), intent(in) :: x
+
+    twice = 2*x
+  end function twice
+
+  real function thrice(x)
+    real(4), intent(in) :: x
+
+    thrice = 3*x
+  end function thrice
+
+  integer function nsquare(n)
+    integer, intent(in) :: n
+
+    nsquare = n*n
+  end function nsquare
+
+  integer function negate(n)
+    integer, intent(in) :: n
+
+    negate = -n
+  end function negate
+
+  logical function is_positive(x)
+    real(8), intent(in) :: x
+
+    is_positive = x > 0d0
+  end function is_positive
+
+  complex(8) function conjugate(z)
+    complex(8), intent(in) :: z
+
+    conjugate = conjg(z)
+  end function conjugate
+
+end module mod_functions
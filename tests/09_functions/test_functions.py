@@ -0,0 +1,146 @@
+"""
+Results of Fortran functions are returned by value
+"""
+
+import os
+from shutil import copy
+
+import pytest
+import numpy as np
+from fffi import FortranModule, cache
+from fffi.fortran_wrapper import call_fortran
+
+FDEF = """
+    pure function norm(vec)
+      real(8), intent(in) :: vec(:)
+      real(8) :: norm
+    end function
+
+    integer(8) function total(n) result(s)
+      integer, intent(in) :: n
+    end function
+
+    real(4) function half(x)
+      real(4), intent(in) :: x
+    end function
+
+    real function twice(x)
+      real(4), intent(in) :: x
+    end function
+
+    FUNCTION THRICE(X)
+      REAL(4), INTENT(IN) :: X
+    END FUNCTION
+
+    function nsquare(n)
+      integer, intent(in) :: n
+    end function
+
+    FUNCTION NEGATE(N)
+      INTEGER, INTENT(IN) :: N
+      integer :: negate
+    END FUNCTION
+
+    logical function is_positive(x)
+      real(8), intent(in) :: x
+    end function
+
+    complex(8) function conjugate(z)
+      complex(8), intent(in) :: z
+    end function
+    """
+
+
+@pytest.fixture(scope='module')
+def tmp(tmp_path_factory):
+    return tmp_path_factory.mktemp('functions')
+
+
+@pytest.fixture(scope='module')
+def mod(tmp):
+    cwd = os.path.dirname(__file__)
+
+    copy(os.path.join(cwd, 'Makefile'), tmp)
+    copy(os.path.join(cwd, 'mod_functions.f90'), tmp)
+
+    os.chdir(tmp)
+    os.system('make')
+
+    fort_mod = FortranModule('test_functions', 'mod_functions', path=tmp)
+    fort_mod.fdef(FDEF)
+    fort_mod.compile()
+    fort_mod.load()
+    return fort_mod
+
+
+def test_result(mod):
+    assert mod.norm(np.array([3.0, 4.0])) == 5.0
+    assert mod.total(100000) == 5000050000
+    assert mod.half(3.0) == 1.5
+    assert mod.twice(1.5) == 3.0
+    assert mod.nsquare(7) == 49
+    assert mod.negate(5) == -5
+    assert mod.thrice(1.5) == 4.5
+    assert mod.is_positive(1.0)
+    assert not mod.is_positive(-1.0)
+    assert mod.conjugate(1+2j) == 1-2j
+
+
+def test_signature(mod):
+    signature = mod.lib.interfaces['mod_functions']['subprograms']['total']
+    assert signature['result']['name'] == 's'
+    assert signature['result']['dtype'] == 'int'
+    assert signature['result']['precision'] == 8
+    subprograms = mod.lib.interfaces['mod_functions']['subprograms']
+    for name, dtype in [('twice', 'real'), ('thrice', 'real'),
+                        ('nsquare', 'int'), ('negate', 'int')]:
+        assert subprograms[name]['result']['dtype'] == dtype
+        assert subprograms[name]['result']['precision'] == 4
+    assert mod.norm.threadsafe
+    assert mod.norm._batch is None
+
+
+def test_abi(mod, tmp):
+    mod_abi = FortranModule('test_functions', 'mod_functions', path=tmp,
+                            mode='abi')
+    mod_abi.fdef(FDEF)
+    mod_abi.load()
+
+    assert mod_abi.norm(np.array([3.0, 4.0])) == 5.0
+    assert mod_abi.total(10) == 55
+
+
+def test_unsupported(mod, caplog, monkeypatch):
+    """
+    Implicitly typed results are supported, and functions with results
+    that are not returned by value are skipped with a warning
+    """
+    monkeypatch.setattr(cache, 'ENABLED', False)  # warn when parsing
+    mod.fdef("""
+        function real_implicit(x)
+          real(8), intent(in) :: x
+        end function
+
+        function vec3(x)
+          real(8), intent(in) :: x
+          real(8) :: vec3(3)
+        end function
+
+        subroutine other(x)
+          real(8) :: x
+        end subroutine
+        """)
+
+    subprograms = mod.lib.interfaces['mod_functions']['subprograms']
+    assert subprograms['real_implicit']['result']['dtype'] == 'real'
+    assert subprograms['real_implicit']['result']['precision'] == 4
+    assert 'other' in subprograms
+    assert 'vec3' not in subprograms
+    assert 'Skipping function vec3' in caplog.text
+
+
+def test_call_fortran(mod):
+    lib = mod.lib
+    result = call_fortran(lib._ffi, lib._lib, 'half', lib.compiler,
+                          'mod_functions', np.array(3.0, dtype=np.float32))
+    assert result == 1.5
@@ -0,0 +1,41 @@
+module mod_memory
+  implicit none
+
+  type point
+    real(8) :: x, y
+  end type point
+
+  integer :: counter = 0
+  real(8) :: values(8) = 1d0
+  real(8), allocatable :: field(:,:)
+
+contains
+
+  subroutine init()
+    if (.not. allocated(field)) allocate(field(4, 3))
+    field = 1d0
+  end subroutine init
+
+  subroutine scale(arr, x)
+    real(8), intent(inout) :: arr(:,:)
+    real(8), intent(in) :: x
+
+    arr = x*arr
+  end subroutine scale
+
+  subroutine count_chars(s, n)
+    character(len=*), intent(in) :: s
+    integer, intent(out) :: n
+
+    n = len(s)
+    counter = counter + 1
+  end subroutine count_chars
+
+  subroutine move(p, dx)
+    type(point), intent(inout) :: p
+    real(8), intent(in) :: dx
+
+    p%x = p%x + dx
+  end subroutine move
+
+end module mod_memory
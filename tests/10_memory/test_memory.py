@@ -0,0 +1,151 @@
+"""
+Memory regression tests for calls with arrays, strings, derived types and
+reads of module variables in long loops. The Python heap traced by
+tracemalloc and the resident set size of the process must stay flat.
+"""
+
+import gc
+import os
+import tracemalloc
+from shutil import copy
+
+import pytest
+import numpy as np
+from fffi import FortranModule
+from fffi.fortran_wrapper import (
+    call_fortran, fortran2numpy, mangle, numpy2fortran)
+
+NCALLS = 10000
+
+FDEF = """
+    type point
+      real(8) :: x, y
+    end type
+
+    integer :: counter
+    real(8) :: values(8)
+    real(8), allocatable :: field(:,:)
+
+    subroutine init()
+    end subroutine
+
+    subroutine scale(arr, x)
+      real(8), intent(inout) :: arr(:,:)
+      real(8), intent(in) :: x
+    end subroutine
+
+    subroutine count_chars(s, n)
+      character(len=*), intent(in) :: s
+      integer, intent(out) :: n
+    end subroutine
+
+    subroutine move(p, dx)
+      type(point), intent(inout) :: p
+      real(8), intent(in) :: dx
+    end subroutine
+    """
+
+
+@pytest.fixture(scope='module')
+def tmp(tmp_path_factory):
+    return tmp_path_factory.mktemp('memory')
+
+
+@pytest.fixture(scope='module')
+def mod(tmp):
+    cwd = os.path.dirname(__file__)
+
+    copy(os.path.join(cwd, 'Makefile'), tmp)
+    copy(os.path.join(cwd, 'mod_memory.f90'), tmp)
+
+    os.chdir(tmp)
+    os.system('make')
+
+    fort_mod = FortranModule('test_memory', 'mod_memory', path=tmp)
+    fort_mod.fdef(FDEF)
+    fort_mod.compile()
+    fort_mod.load()
+    fort_mod.init()
+    return fort_mod
+
+
+def calls(mod):
+    """
+    Returns functions that each make one call of a kind to be repeated
+    """
+    ffi, lib, compiler = mod.lib._ffi, mod.lib._lib, mod.lib.compiler
+    arr = np.ones((4, 3), order='F')
+    n = np.zeros((), dtype=np.int32)
+    point = mod.new('point')
+    field = ffi.addressof(lib, mangle(compiler, 'mod_memory', 'field'))
+    return {
+        'array': lambda: mod.scale(arr, 1.0),
+        'array new': lambda: mod.scale(np.ones((4, 3), order='F'), 1.0),
+        'call_fortran': lambda: call_fortran(
+            ffi, lib, 'scale', compiler, 'mod_memory', arr, 1.0),
+        'numpy2fortran': lambda: numpy2fortran(ffi, arr, compiler),
+        'string': lambda: mod.count_chars('Hello, Fortran!', n),
+        'derived type': lambda: mod.move(point, 1.0),
+        'variable scalar': lambda: mod.counter,
+        'variable array': lambda: mod.values,
+        'variable allocatable': lambda: mod.field,
+        'fortran2numpy': lambda: fortran2numpy(ffi, field[0]),
+    }
+
+
+CASES = ['array', 'array new', 'call_fortran', 'numpy2fortran', 'string',
+         'derived type', 'variable scalar', 'variable array',
+         'variable allocatable', 'fortran2numpy']
+
+
+def rss():
+    """
+    Returns the resident set size of this process in bytes
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        pytest.skip('Resident set size is only available on Linux')
+
+
+def repeat(call, ncalls):
+    for _ in range(ncalls):
+        call()
+    gc.collect()
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_heap(mod, case):
+    """
+    Memory traced by tracemalloc stays flat over many calls
+    """
+    call = calls(mod)[case]
+    tracemalloc.start()
+    try:
+        repeat(call, 100)  # fill caches
+        before = tracemalloc.get_traced_memory()[0]
+        repeat(call, NCALLS)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    assert after - before < 4096, '{} bytes per call'.format(
+        (after - before)/NCALLS)
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_rss(mod, case):
+    """
+    Resident set size stays flat, including memory allocated outside
+    of Python, e.g. by cffi or Fortran
+    """
+    call = calls(mod)[case]
+    repeat(call, 1000)
+    before = rss()
+    repeat(call, 5*NCALLS)
+    after = rss()
+
+    # A leak of 8 bytes per call would add about 400 kB
+    assert after - before < 256*1024, '{} bytes per call'.format(
+        (after - before)/(5*NCALLS))
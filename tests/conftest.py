@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def cachedir(tmp_path_factory):
+    """
+    Keeps fdef results and builds cached by tests out of ~/.cache/fffi
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('FFFI_CACHE_DIR', str(tmp_path_factory.mktemp('cache')))
+        yield